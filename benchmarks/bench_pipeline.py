@@ -0,0 +1,132 @@
+"""Benchmark do pipeline completo, por modo e por etapa, com relatório JSON.
+
+Gera um conjunto sintético (dados_sinteticos.py) e roda cada modo pelo mesmo caminho do
+`python -m gerar_mapas`, cronometrando as etapas instrumentadas em processamento.py
+(ingestao, normalizacao, geometria, recorte, buffer_uniao, classificacao, figura, pdf...).
+O relatório traz commit, máquina e escala, para comparar execuções entre commits.
+
+Cada etapa traz segundos, CPU, chamadas, crescimento do pico de RSS e as contagens de
+linhas/geometrias. O padrão é --processos 1: com mais processos as medições das fazendas
+voltam do pool, mas os segundos das etapas se somam entre processos.
+
+Uso:
+    python benchmarks/bench_pipeline.py --fazendas 40 --relatorio benchmarks/resultados/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_pipeline.py --modos area vel-rpm-pontos --pontos 50000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from processamento import (  # noqa: E402
+    MODO_AREA,
+    MODO_OPERADOR,
+    MODO_VEL_RPM,
+    FRENTES,
+    PARAMETROS_PADRAO,
+    carregar_base_cartografica,
+    chave_ordenacao_mista,
+    coletar_etapas,
+    resumir_etapas,
+)
+from gerar_mapas import gerar_mapas  # noqa: E402
+from dados_sinteticos import adicionar_argumentos_escala, escala_dos_argumentos, gerar_conjunto  # noqa: E402
+
+# nome no relatório -> (modo do app, ZIP do conjunto sintético)
+MODOS_BENCH = {
+    "area": (MODO_AREA, "area"),
+    "operador": (MODO_OPERADOR, "linhas"),
+    "vel-rpm-linhas": (MODO_VEL_RPM, "linhas"),
+    "vel-rpm-pontos": (MODO_VEL_RPM, "pontos"),
+}
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def frentes_sinteticas(fazendas_base):
+    """Distribui as fazendas da base entre F1/F2/F3, em rodízio."""
+    codigos = sorted(fazendas_base, key=chave_ordenacao_mista)
+    return {nome_frente: codigos[i::len(FRENTES)] for i, nome_frente in enumerate(FRENTES)}
+
+
+def rodar_modo(nome, conjunto, saida, frente_fazendas, num_processos):
+    modo, chave_zip = MODOS_BENCH[nome]
+    inicio = time.perf_counter()
+    with coletar_etapas() as registros:
+        arquivos = gerar_mapas(
+            os.path.dirname(conjunto[chave_zip]), modo, os.path.join(saida, nome), conjunto["base"],
+            dict(PARAMETROS_PADRAO, MOSTRAR_TALHOES=True), frente_fazendas, num_processos,
+        )
+    return {
+        "total_seg": round(time.perf_counter() - inicio, 4),
+        "arquivos": len(arquivos),
+        "etapas": {
+            etapa: {chave: round(valor, 4) if isinstance(valor, float) else valor for chave, valor in v.items()}
+            for etapa, v in resumir_etapas([r for r in registros if r["etapa"] != "fazenda"]).items()
+        },
+    }
+
+
+def imprimir_resumo(relatorio):
+    print(f"base_cartografica: {relatorio['base_cartografica_seg']:.2f} s", file=sys.stderr)
+    for nome, resultado in relatorio["modos"].items():
+        etapas = "  ".join(f"{etapa}={v['segundos']:.2f}" for etapa, v in resultado["etapas"].items())
+        print(f"{nome:>15}: {resultado['total_seg']:7.2f} s  {resultado['arquivos']:4d} arquivos  {etapas}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    adicionar_argumentos_escala(parser)
+    parser.add_argument("--modos", nargs="+", choices=list(MODOS_BENCH), default=list(MODOS_BENCH))
+    parser.add_argument("--pasta", help="pasta do conjunto sintético e das saídas (padrão: temporária)")
+    parser.add_argument("--processos", type=int, default=1)
+    parser.add_argument("--relatorio", help="caminho do JSON (padrão: stdout)")
+    args = parser.parse_args()
+
+    pasta = args.pasta or tempfile.mkdtemp(prefix="bench_area_trabalhada_")
+    escala = escala_dos_argumentos(args)
+    inicio = time.perf_counter()
+    conjunto = gerar_conjunto(pasta, args.semente, **escala)
+    print(f"Conjunto sintético em {pasta} ({time.perf_counter() - inicio:.1f} s): {conjunto['linhas_csv']}", file=sys.stderr)
+
+    inicio = time.perf_counter()
+    fazendas_base = carregar_base_cartografica(conjunto["base"])["fazendas"]
+    relatorio = {
+        "commit": commit_atual(),
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "maquina": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "escala": {**escala, "semente": args.semente, "linhas_csv": conjunto["linhas_csv"]},
+        "processos": args.processos,
+        "base_cartografica_seg": round(time.perf_counter() - inicio, 4),
+        "modos": {},
+    }
+    frente_fazendas = frentes_sinteticas(fazendas_base)
+    for nome in args.modos:
+        relatorio["modos"][nome] = rodar_modo(nome, conjunto, os.path.join(pasta, "saida"), frente_fazendas, args.processos)
+
+    imprimir_resumo(relatorio)
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.relatorio:
+        os.makedirs(os.path.dirname(os.path.abspath(args.relatorio)), exist_ok=True)
+        with open(args.relatorio, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Benchmark da segmentação de pontos em trechos (criar_linhas_por_pontos).
+
+Gera um dia sintético de pings GPS e compara o motor vetorizado com o laço antigo
+por `iterrows`. O laço antigo roda numa amostra (é linear no número de pontos) e o
+tempo é extrapolado para o total.
+
+Uso:
+    python benchmarks/bench_segmentacao.py --pontos 5000000 --amostra-legado 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import LineString, box
+from shapely.ops import unary_union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processamento import CRS_METRICO, LARGURA_PADRAO_M, TEMPO_MAX_SEG, criar_linhas_por_pontos, transformador_metrico  # noqa: E402
+
+LON_CENTRO, LAT_CENTRO = -45.0, -21.0
+
+
+def gerar_dia_pontos(n_pontos, n_equipamentos=60, semente=42):
+    """Pings de um dia por equipamento, a cada 1–2 s e com ~0,1% de paradas longas."""
+    rng = np.random.default_rng(semente)
+    por_equip = int(np.ceil(n_pontos / n_equipamentos))
+    intervalos = rng.integers(1, 3, size=(n_equipamentos, por_equip)).astype("float64")
+    paradas = rng.random((n_equipamentos, por_equip)) < 0.001
+    intervalos[paradas] = rng.integers(TEMPO_MAX_SEG + 1, 600, size=int(paradas.sum()))
+    segundos = np.cumsum(intervalos, axis=1)
+    rumo = rng.uniform(0, 2 * np.pi, size=(n_equipamentos, 1)) + np.cumsum(rng.normal(0, 0.03, size=(n_equipamentos, por_equip)), axis=1)
+    passo = 1.7 * np.minimum(intervalos, 2)
+    origem = rng.uniform(-2500, 2500, size=(n_equipamentos, 1, 2))
+    xy = origem + np.cumsum(np.stack([passo * np.cos(rumo), passo * np.sin(rumo)], axis=-1), axis=1)
+    xy = 3000 - np.abs((xy + 3000) % 12000 - 6000)
+    lon = LON_CENTRO + xy[..., 0] / (111320 * np.cos(np.radians(LAT_CENTRO)))
+    lat = LAT_CENTRO + xy[..., 1] / 110540
+    df = pd.DataFrame({
+        "cd_equipamento": np.repeat([f"{5000 + i}" for i in range(n_equipamentos)], por_equip),
+        "dt_hr_local_inicial": pd.Timestamp("2025-10-29") + pd.to_timedelta(segundos.ravel(), unit="s"),
+        "vl_longitude_inicial": lon.ravel(),
+        "vl_latitude_inicial": lat.ravel(),
+        "vl_rpm": rng.normal(1600, 200, size=n_equipamentos * por_equip),
+        "vl_velocidade": rng.normal(6, 1.5, size=n_equipamentos * por_equip),
+    })
+    df.loc[rng.random(len(df)) < 0.02, "vl_rpm"] = np.nan
+    return df.iloc[:n_pontos].sample(frac=1.0, random_state=semente).reset_index(drop=True)
+
+
+def geometria_fazenda():
+    """Fazenda sintética cobrindo a maior parte da área percorrida, no CRS métrico."""
+    x0, y0 = transformador_metrico().transform(LON_CENTRO, LAT_CENTRO)
+    return unary_union([box(x0 - 2600, y0 - 2600, x0, y0 + 2600), box(x0, y0 - 2200, x0 + 2600, y0 + 2200)])
+
+
+def _adicionar_segmento_legado(linhas_saida, pontos, rpms, vels, t_inicio, t_fim, geom_fazenda):
+    if len(pontos) < 2:
+        return
+    try:
+        linha = LineString(pontos)
+    except Exception:
+        return
+    if linha.is_empty or linha.length == 0:
+        return
+    linha_clip = linha.intersection(geom_fazenda)
+    if linha_clip.is_empty:
+        return
+    rpm = float(np.nanmean(rpms)) if len(rpms) else np.nan
+    vel = float(np.nanmean(vels)) if len(vels) else np.nan
+    duracao = (t_fim - t_inicio).total_seconds() if t_inicio is not None and t_fim is not None else np.nan
+    if linha_clip.geom_type == "LineString":
+        geoms = [linha_clip]
+    elif linha_clip.geom_type == "MultiLineString":
+        geoms = [g for g in linha_clip.geoms if not g.is_empty and g.length > 0]
+    else:
+        geoms = []
+    for g in geoms:
+        linhas_saida.append({"geometry": g, "rpm_medio": rpm, "vel_media": vel, "duracao_seg": duracao, "largura_media": LARGURA_PADRAO_M})
+
+
+def criar_linhas_por_pontos_legado(df_faz, geom_fazenda):
+    """Cópia do laço por iterrows substituído, mantida só como referência de tempo."""
+    gdf_pts = gpd.GeoDataFrame(
+        df_faz,
+        geometry=gpd.points_from_xy(df_faz["vl_longitude_inicial"], df_faz["vl_latitude_inicial"]),
+        crs="EPSG:4326",
+    ).to_crs(epsg=CRS_METRICO)
+    linhas = []
+    for _, grupo in gdf_pts.groupby("cd_equipamento"):
+        grupo = grupo.sort_values("dt_hr_local_inicial")
+        linha_atual, rpm_atual, vel_atual = [], [], []
+        tempo_inicio, ultimo_tempo = None, None
+        for _, row in grupo.iterrows():
+            tempo = row["dt_hr_local_inicial"]
+            if ultimo_tempo is None:
+                linha_atual = [row.geometry]
+                rpm_atual = [row.get("vl_rpm", np.nan)]
+                vel_atual = [row.get("vl_velocidade", np.nan)]
+                tempo_inicio = tempo
+            else:
+                delta = (tempo - ultimo_tempo).total_seconds()
+                if delta <= TEMPO_MAX_SEG:
+                    linha_atual.append(row.geometry)
+                    rpm_atual.append(row.get("vl_rpm", np.nan))
+                    vel_atual.append(row.get("vl_velocidade", np.nan))
+                else:
+                    _adicionar_segmento_legado(linhas, linha_atual, rpm_atual, vel_atual, tempo_inicio, ultimo_tempo, geom_fazenda)
+                    linha_atual = [row.geometry]
+                    rpm_atual = [row.get("vl_rpm", np.nan)]
+                    vel_atual = [row.get("vl_velocidade", np.nan)]
+                    tempo_inicio = tempo
+            ultimo_tempo = tempo
+        _adicionar_segmento_legado(linhas, linha_atual, rpm_atual, vel_atual, tempo_inicio, ultimo_tempo, geom_fazenda)
+    return gpd.GeoDataFrame(linhas, geometry="geometry", crs=f"EPSG:{CRS_METRICO}") if linhas else gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def resumo(gdf):
+    return f"{len(gdf)} trechos, {gdf.length.sum() / 1000:.1f} km"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pontos", type=int, default=5_000_000)
+    parser.add_argument("--equipamentos", type=int, default=60)
+    parser.add_argument("--amostra-legado", type=int, default=200_000, help="pontos usados no laço antigo (0 = pular)")
+    args = parser.parse_args()
+
+    geom_fazenda = geometria_fazenda()
+    df, t_gerar = cronometrar(gerar_dia_pontos, args.pontos, args.equipamentos)
+    print(f"Dia sintético: {len(df):,} pontos, {args.equipamentos} equipamentos ({t_gerar:.1f} s para gerar)")
+
+    gdf_novo, t_novo = cronometrar(criar_linhas_por_pontos, df, geom_fazenda)
+    print(f"Vetorizado: {t_novo:8.2f} s  ({resumo(gdf_novo)})")
+
+    if args.amostra_legado > 0:
+        amostra = df.iloc[:min(args.amostra_legado, len(df))]
+        gdf_leg, t_leg = cronometrar(criar_linhas_por_pontos_legado, amostra, geom_fazenda)
+        gdf_amostra, t_amostra = cronometrar(criar_linhas_por_pontos, amostra, geom_fazenda)
+        t_leg_total = t_leg * len(df) / len(amostra)
+        print(f"Amostra de {len(amostra):,} pontos: legado {t_leg:.2f} s ({resumo(gdf_leg)}) | vetorizado {t_amostra:.2f} s ({resumo(gdf_amostra)})")
+        print(f"Legado extrapolado: {t_leg_total:8.2f} s  ->  ganho de {t_leg_total / t_novo:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
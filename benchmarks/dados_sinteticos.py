@@ -0,0 +1,226 @@
+"""Conjuntos sintéticos no formato da Solinftec para os benchmarks.
+
+Gera, em escala configurável, uma base cartográfica GPKG (FAZENDA/PROPRIEDADE/GLEBA/TALHAO)
+e os ZIPs de cada modo: CSV de área (POLYGON em WKT), CSV de linhas (LINESTRING com
+colhedora/operador ao longo dos três turnos) e CSV de pontos de telemetria
+(cd_estado/cd_operacao_parada). Cada ZIP fica numa pasta própria, no formato que o
+`python -m gerar_mapas --zips` espera.
+
+Uso:
+    python benchmarks/dados_sinteticos.py /tmp/dados_bench --fazendas 40 --pontos 20000
+"""
+import argparse
+import io
+import os
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processamento import CRS_METRICO, TEMPO_MAX_SEG, transformador_metrico  # noqa: E402
+
+ESCALA_PADRAO = {
+    "fazendas": 10,
+    "talhoes": 24,
+    "equipamentos": 3,
+    "passadas": 300,
+    "linhas": 200,
+    "pontos": 20000,
+}
+LARGURA_TALHAO_M, ALTURA_TALHAO_M, TALHOES_POR_LINHA, TALHOES_POR_GLEBA = 500.0, 400.0, 6, 6
+ESPACO_FAZENDAS_M = 6000.0
+DIA = pd.Timestamp("2025-10-29")
+
+
+def origem_fazenda(indice):
+    x0, y0 = transformador_metrico().transform(-47.5, -21.2)
+    return x0 + (indice % 8) * ESPACO_FAZENDAS_M, y0 + (indice // 8) * ESPACO_FAZENDAS_M
+
+
+def extensao_fazenda(indice, talhoes):
+    ox, oy = origem_fazenda(indice)
+    linhas = int(np.ceil(talhoes / TALHOES_POR_LINHA))
+    return ox, oy, ox + min(talhoes, TALHOES_POR_LINHA) * LARGURA_TALHAO_M, oy + linhas * ALTURA_TALHAO_M
+
+
+def codigo_fazenda(indice):
+    return str(1000 + indice)
+
+
+def para_lonlat(geoms):
+    """Geometrias do CRS métrico para EPSG:4326, em lote."""
+    x_para_lon = transformador_metrico().transform
+
+    def converter(coords):
+        lon, lat = x_para_lon(coords[:, 0], coords[:, 1], direction="INVERSE")
+        return np.column_stack([lon, lat])
+    return shapely.transform(geoms, converter)
+
+
+def gerar_base(fazendas, talhoes):
+    registros = []
+    for f in range(fazendas):
+        ox, oy = origem_fazenda(f)
+        for t in range(talhoes):
+            x = ox + (t % TALHOES_POR_LINHA) * LARGURA_TALHAO_M
+            y = oy + (t // TALHOES_POR_LINHA) * ALTURA_TALHAO_M
+            registros.append({
+                "FAZENDA": 1000 + f,
+                "PROPRIEDADE": f"FAZENDA SINTETICA {f + 1:03d}",
+                "GLEBA": 1 + t // TALHOES_POR_GLEBA,
+                "TALHAO": t + 1,
+                "geometry": shapely.box(x + 2, y + 2, x + LARGURA_TALHAO_M - 2, y + ALTURA_TALHAO_M - 2),
+            })
+    base = gpd.GeoDataFrame(registros, geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    return base.to_crs("EPSG:4326")
+
+
+def horarios_do_dia(rng, n):
+    """Horários espalhados pelas 24 h, para cair nos três turnos."""
+    return DIA + pd.to_timedelta(np.sort(rng.uniform(0, 86399, size=n)), unit="s")
+
+
+def gerar_csv_area(rng, fazendas, talhoes, passadas):
+    partes = []
+    for f in range(fazendas):
+        xmin, ymin, xmax, ymax = extensao_fazenda(f, talhoes)
+        # Passadas paralelas de 3 m com falhas entre elas e extremos irregulares.
+        y = ymin + np.sort(rng.uniform(0, ymax - ymin - 3, size=passadas))
+        x_ini = xmin - rng.uniform(-40, 60, size=passadas)
+        x_fim = xmax + rng.uniform(-400, 60, size=passadas)
+        geoms = para_lonlat(shapely.box(x_ini, y, x_fim, y + 3.0))
+        inicio = horarios_do_dia(rng, passadas)
+        partes.append(pd.DataFrame({
+            "cd_fazenda": codigo_fazenda(f),
+            "cd_equipamento": rng.integers(5000, 5010, size=passadas),
+            "vl_largura_implemento": 3.0,
+            "dt_hr_local_inicial": inicio,
+            "dt_hr_local_final": inicio + pd.Timedelta(minutes=4),
+            "wkt": shapely.to_wkt(geoms, rounding_precision=8),
+        }))
+    return pd.concat(partes, ignore_index=True)
+
+
+def gerar_csv_linhas(rng, fazendas, talhoes, equipamentos, linhas):
+    partes = []
+    for f in range(fazendas):
+        xmin, ymin, xmax, ymax = extensao_fazenda(f, talhoes)
+        for e in range(equipamentos):
+            n_vertices = 6
+            y = rng.uniform(ymin - 20, ymax + 20, size=(linhas, 1)) + rng.normal(0, 1.5, size=(linhas, n_vertices))
+            x = np.linspace(0, 1, n_vertices) * rng.uniform(300, 1500, size=(linhas, 1)) + rng.uniform(xmin - 100, xmax - 300, size=(linhas, 1))
+            coords = np.stack([x, y], axis=-1).reshape(-1, 2)
+            geoms = para_lonlat(shapely.linestrings(coords, indices=np.repeat(np.arange(linhas), n_vertices)))
+            inicio = horarios_do_dia(rng, linhas)
+            operador = rng.integers(0, 2, size=linhas)
+            partes.append(pd.DataFrame({
+                "cd_fazenda": codigo_fazenda(f),
+                "cd_equipamento": str(5000 + e),
+                "cd_operador": (900 + 10 * e + operador).astype(str),
+                "desc_operador": [f"OPERADOR {e}-{o}" for o in operador],
+                "dt_hr_local_inicial": inicio,
+                "dt_hr_local_final": inicio + pd.to_timedelta(rng.uniform(60, 600, size=linhas), unit="s"),
+                "vl_largura_implemento": rng.choice([3.0, 3.0, 3.0, 0.0], size=linhas),
+                "vl_rpm": rng.normal(1600, 250, size=linhas).round(0),
+                "vl_velocidade": rng.normal(6, 1.5, size=linhas).round(2),
+                "cd_estado": "E",
+                "cd_operacao_parada": -1,
+                "wkt": shapely.to_wkt(geoms, rounding_precision=8),
+            }))
+    return pd.concat(partes, ignore_index=True)
+
+
+def gerar_csv_pontos(rng, fazendas, talhoes, equipamentos, pontos):
+    partes = []
+    lon_lat = transformador_metrico().transform
+    for f in range(fazendas):
+        xmin, ymin, xmax, ymax = extensao_fazenda(f, talhoes)
+        for e in range(equipamentos):
+            intervalos = rng.integers(1, 3, size=pontos).astype("float64")
+            paradas_longas = rng.random(pontos) < 0.001
+            intervalos[paradas_longas] = rng.integers(TEMPO_MAX_SEG + 1, 900, size=int(paradas_longas.sum()))
+            segundos = 6 * 3600 + np.cumsum(intervalos)
+            # Vai e vem, dobrando nas bordas; as faixas se espalham por toda a altura da fazenda.
+            distancia = np.cumsum(1.7 * np.minimum(intervalos, 2))
+            largura = xmax - xmin
+            faixa = (distancia // largura).astype(int)
+            avanco = distancia % largura
+            espacamento = max((ymax - ymin - 20) / (faixa[-1] + 1), 6.0)
+            x = np.where(faixa % 2 == 0, xmin + avanco, xmax - avanco) + rng.normal(0, 0.8, size=pontos)
+            y = ymin + 10 + faixa * espacamento + e * espacamento / equipamentos + rng.normal(0, 0.8, size=pontos)
+            lon, lat = lon_lat(x, y, direction="INVERSE")
+            parado = rng.random(pontos) < 0.02
+            partes.append(pd.DataFrame({
+                "cd_fazenda": codigo_fazenda(f),
+                "cd_equipamento": str(5000 + e),
+                "dt_hr_local_inicial": DIA + pd.to_timedelta(segundos, unit="s"),
+                "vl_latitude_inicial": lat,
+                "vl_longitude_inicial": lon,
+                "vl_rpm": np.where(parado, 900, rng.normal(1600, 200, size=pontos)).round(0),
+                "vl_velocidade": np.where(parado, 0, rng.normal(6, 1.5, size=pontos)).round(2),
+                "vl_largura_implemento": 3.0,
+                "cd_estado": np.where(parado, "P", "E"),
+                "cd_operacao_parada": np.where(parado, 5, -1),
+            }))
+    return pd.concat(partes, ignore_index=True).sample(frac=1.0, random_state=int(rng.integers(1 << 31))).reset_index(drop=True)
+
+
+def gravar_zip(caminho, nome_csv, df, sep=";"):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    conteudo = io.StringIO()
+    df.to_csv(conteudo, sep=sep, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(nome_csv, conteudo.getvalue().encode("utf-8"))
+    return caminho
+
+
+def gerar_conjunto(pasta, semente=42, **escala):
+    """Grava base e ZIPs em `pasta`; devolve os caminhos (base, area, linhas, pontos)."""
+    escala = {**ESCALA_PADRAO, **escala}
+    rng = np.random.default_rng(semente)
+    os.makedirs(pasta, exist_ok=True)
+    caminho_base = os.path.join(pasta, "base_sintetica.gpkg")
+    gerar_base(escala["fazendas"], escala["talhoes"]).to_file(caminho_base, driver="GPKG")
+    area = gerar_csv_area(rng, escala["fazendas"], escala["talhoes"], escala["passadas"])
+    linhas = gerar_csv_linhas(rng, escala["fazendas"], escala["talhoes"], escala["equipamentos"], escala["linhas"])
+    pontos = gerar_csv_pontos(rng, escala["fazendas"], escala["talhoes"], escala["equipamentos"], escala["pontos"])
+    return {
+        "base": caminho_base,
+        "area": gravar_zip(os.path.join(pasta, "area", "area.zip"), "area.csv", area),
+        "linhas": gravar_zip(os.path.join(pasta, "linhas", "linhas.zip"), "linhas.csv", linhas, sep=","),
+        "pontos": gravar_zip(os.path.join(pasta, "pontos", "pontos.zip"), "pontos.csv", pontos),
+        "linhas_csv": {"area": len(area), "linhas": len(linhas), "pontos": len(pontos)},
+    }
+
+
+def adicionar_argumentos_escala(parser):
+    parser.add_argument("--fazendas", type=int, default=ESCALA_PADRAO["fazendas"])
+    parser.add_argument("--talhoes", type=int, default=ESCALA_PADRAO["talhoes"], help="talhões por fazenda")
+    parser.add_argument("--equipamentos", type=int, default=ESCALA_PADRAO["equipamentos"], help="colhedoras por fazenda")
+    parser.add_argument("--passadas", type=int, default=ESCALA_PADRAO["passadas"], help="polígonos de área por fazenda")
+    parser.add_argument("--linhas", type=int, default=ESCALA_PADRAO["linhas"], help="linhas por colhedora e fazenda")
+    parser.add_argument("--pontos", type=int, default=ESCALA_PADRAO["pontos"], help="pings por colhedora e fazenda")
+    parser.add_argument("--semente", type=int, default=42)
+
+
+def escala_dos_argumentos(args):
+    return {chave: getattr(args, chave) for chave in ESCALA_PADRAO}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pasta")
+    adicionar_argumentos_escala(parser)
+    args = parser.parse_args()
+    caminhos = gerar_conjunto(args.pasta, args.semente, **escala_dos_argumentos(args))
+    for chave, valor in caminhos.items():
+        print(f"{chave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
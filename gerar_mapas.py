@@ -0,0 +1,299 @@
+"""Geração dos mapas em lote, sem Streamlit (agendamentos e cron).
+
+Lê todos os ZIPs de uma pasta, processa no modo escolhido com os mesmos parâmetros
+da barra lateral e grava os PDFs/CSVs com os mesmos nomes dos downloads do app, mais um manifesto.json
+com as áreas e médias de cada fazenda.
+
+Uso:
+    python -m gerar_mapas --zips dados/ --modo area --saida relatorios/
+    python -m gerar_mapas --zips dados/ --modo vel-rpm --parametros '{"RPM_MIN": 1300, "RPM_MAX": 2100}'
+    python -m gerar_mapas --zips dados/ --modo operador --frentes frentes.json
+
+--parametros e --frentes aceitam JSON direto ou o caminho de um arquivo .json.
+--frentes segue o FRENTE_FAZENDAS do app: {"F1": ["101", "102"], "F2": ["103"], "F3": []}.
+Com --armazem, cada execução só acrescenta ao armazém (Parquet) as linhas que ele ainda não
+tem e os mapas saem do histórico completo das fazendas recebidas:
+    python -m gerar_mapas --zips hoje/ --modo area --armazem armazem/
+Com --salvar-dados, os dados lidos dos ZIPs (todas as colunas dos três modos, com o WKT já
+convertido) ficam num GeoParquet que --dados relê no lugar dos ZIPs, em qualquer modo:
+    python -m gerar_mapas --zips semana/ --modo area --salvar-dados semana.parquet
+    python -m gerar_mapas --dados semana.parquet --modo vel-rpm
+Com --desempenho, as medições de cada etapa e fazenda saem como linhas JSON no stderr
+(ou no arquivo de AREA_TRABALHADA_LOG_DESEMPENHO).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import uuid
+from datetime import datetime
+
+from processamento import (
+    BASE_PADRAO_PATH,
+    MODO_AREA,
+    MODO_OPERADOR,
+    MODO_VEL_RPM,
+    COLUNAS_POR_MODO,
+    FRENTES,
+    PARAMETROS_PADRAO,
+    PASTA_ARMAZEM,
+    normalizar_codigo,
+    chave_ordenacao_mista,
+    validar_colunas,
+    carregar_base_cartografica,
+    colunas_do_modo,
+    ler_dados_zip,
+    salvar_dados_normalizados,
+    ler_dados_normalizados,
+    concatenar_compactos,
+    detectar_coluna_geometria,
+    classificar_turnos,
+    executar_em_paralelo,
+    filtrar_geometrias,
+    filtrar_pontos_operacao,
+    tarefas_por_fazenda,
+    tarefas_operador,
+    juntar_resultados_operador,
+    processar_fazenda_area,
+    processar_fazenda_operador,
+    processar_fazenda_vel_rpm,
+    montar_pdf_frente,
+    nome_pdf_frente,
+    arquivos_resultado,
+    novo_manifesto,
+    resumo_manifesto,
+    manifesto_json,
+    coletar_etapas,
+    medir_etapa,
+    contar_wkt_invalidos,
+    aviso_wkt_invalidos,
+    configurar_log_desempenho,
+    registrar_etapas,
+    conjunto_armazem,
+    processar_incremental,
+    com_areas_brutas,
+)
+
+MODOS_CLI = {"area": MODO_AREA, "operador": MODO_OPERADOR, "vel-rpm": MODO_VEL_RPM}
+
+
+def carregar_json(valor):
+    if os.path.isfile(valor):
+        with open(valor, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    return json.loads(valor)
+
+
+def montar_parametros(parametros_json):
+    parametros = dict(PARAMETROS_PADRAO)
+    if parametros_json:
+        extras = carregar_json(parametros_json)
+        desconhecidos = sorted(set(extras) - set(PARAMETROS_PADRAO))
+        if desconhecidos:
+            raise ValueError("Parâmetros desconhecidos: " + ", ".join(desconhecidos))
+        parametros.update(extras)
+    if parametros["RPM_MAX"] <= parametros["RPM_MIN"]:
+        raise ValueError("RPM_MAX deve ser maior que RPM_MIN.")
+    if parametros["VEL_MAX"] <= parametros["VEL_MIN"]:
+        raise ValueError("VEL_MAX deve ser maior que VEL_MIN.")
+    return parametros
+
+
+def montar_frentes(frentes_json):
+    frentes = carregar_json(frentes_json) if frentes_json else {}
+    desconhecidas = sorted(set(frentes) - set(FRENTES))
+    if desconhecidas:
+        raise ValueError("Frentes desconhecidas: " + ", ".join(desconhecidas))
+    return {nome_frente: [normalizar_codigo(c) for c in frentes.get(nome_frente, [])] for nome_frente in FRENTES}
+
+
+def ler_pasta_zips(pasta, modo):
+    """CSVs de todos os ZIPs da pasta; com modo None, lê as colunas de todos os modos."""
+    caminhos = sorted(set(glob.glob(os.path.join(pasta, "*.zip")) + glob.glob(os.path.join(pasta, "*.ZIP"))))
+    if not caminhos:
+        raise ValueError(f"Nenhum ZIP encontrado em {pasta}")
+    dfs = []
+    for caminho in caminhos:
+        dados_zip = ler_dados_zip(caminho, colunas_do_modo(modo))
+        if dados_zip["csvs"] == 0:
+            print(f"Aviso: nenhum CSV encontrado no ZIP {os.path.basename(caminho)}", file=sys.stderr)
+        for erro in dados_zip["erros"]:
+            print(f"Aviso: {erro}", file=sys.stderr)
+        if dados_zip["df"] is not None:
+            dfs.append(dados_zip["df"])
+    if not dfs:
+        raise ValueError("Nenhum dado válido encontrado nos ZIPs.")
+    return concatenar_compactos(dfs)
+
+
+def ler_entrada(pasta_zips, modo, dados=None, salvar_dados=None):
+    """Dados do modo a partir dos ZIPs ou do GeoParquet de --dados; com `salvar_dados`, exporta antes."""
+    if dados:
+        dados_normalizados = ler_dados_normalizados(dados, colunas_do_modo(modo))
+        if dados_normalizados["erros"]:
+            raise ValueError(dados_normalizados["erros"][0])
+        return dados_normalizados["df"]
+    if not pasta_zips:
+        raise ValueError("Informe --zips ou --dados.")
+    df = ler_pasta_zips(pasta_zips, None if salvar_dados else modo)
+    if salvar_dados:
+        salvar_dados_normalizados(df, salvar_dados)
+    return df
+
+
+def gravar(saida, nome_arquivo, conteudo):
+    caminho = os.path.join(saida, nome_arquivo)
+    with open(caminho, "wb") as arquivo:
+        arquivo.write(conteudo)
+    return caminho
+
+
+def gravar_resultado(saida, resultado, manifesto):
+    """Grava os arquivos de uma fazenda e acrescenta a linha dela ao manifesto."""
+    caminhos = [gravar(saida, nome, conteudo) for nome, conteudo in arquivos_resultado(resultado)]
+    manifesto["fazendas"].append(resumo_manifesto(resultado, [os.path.basename(c) for c in caminhos]))
+    return caminhos
+
+
+def gerar_area(df, fazendas_base, parametros, saida, num_processos, manifesto, armazem=None):
+    coluna_poligono = "wkt" if "wkt" in df.columns else detectar_coluna_geometria(df, ["MULTIPOLYGON", "POLYGON"])
+    if coluna_poligono is None:
+        raise ValueError("O modo Área Trabalhada precisa de um CSV de área da Solinftec.")
+    df_area = filtrar_geometrias(df, coluna_poligono, "POLYGON")
+    if armazem:
+        df_area, areas_brutas = processar_incremental(armazem, conjunto_armazem(MODO_AREA), df_area, coluna_poligono, num_processos)
+        if df_area is None:
+            return []
+        fazendas_base = com_areas_brutas(fazendas_base, areas_brutas)
+    tarefas = tarefas_por_fazenda(df_area, fazendas_base, coluna_poligono, parametros, False)
+    arquivos = []
+    for resultado in executar_em_paralelo(processar_fazenda_area, tarefas, num_processos):
+        if resultado is not None:
+            arquivos.extend(gravar_resultado(saida, resultado, manifesto))
+    return arquivos
+
+
+def gerar_operador(df, fazendas_base, parametros, frente_fazendas, saida, num_processos, manifesto, armazem=None):
+    coluna_linha = detectar_coluna_geometria(df, ["LINESTRING", "MULTILINESTRING"])
+    if coluna_linha is None or validar_colunas(df, COLUNAS_POR_MODO[MODO_OPERADOR]["obrigatorias"]):
+        raise ValueError("O modo Colhedora/operador precisa de um CSV de linhas da Solinftec com colhedora, operador, horário e largura.")
+    if not any(frente_fazendas.values()):
+        raise ValueError("Informe as fazendas de cada frente em --frentes.")
+    df_linhas = filtrar_geometrias(df, coluna_linha, "LINESTRING")
+    if armazem:
+        df_linhas, _ = processar_incremental(armazem, conjunto_armazem(MODO_OPERADOR), df_linhas)
+        if df_linhas is None:
+            return []
+    df_linhas["turno"] = classificar_turnos(df_linhas["dt_hr_local_inicial"])
+    df_linhas = df_linhas.dropna(subset=["turno"])
+    com_frente = {c for fazendas in frente_fazendas.values() for c in fazendas}
+    sem_frente = sorted(set(df_linhas["cd_fazenda"].dropna().unique()) - com_frente, key=chave_ordenacao_mista)
+    if sem_frente:
+        print("Aviso: fazendas sem frente ignoradas: " + ", ".join(sem_frente), file=sys.stderr)
+
+    tarefas = tarefas_operador(df_linhas, coluna_linha, frente_fazendas, fazendas_base, parametros, False)
+    registros = juntar_resultados_operador(executar_em_paralelo(processar_fazenda_operador, tarefas, num_processos))
+    arquivos = []
+    for nome_frente in FRENTES:
+        registros_frente = [r for r in registros if r["frente"] == nome_frente]
+        if not registros_frente:
+            continue
+        arquivos.append(gravar(saida, nome_pdf_frente(nome_frente), montar_pdf_frente(nome_frente, registros_frente)))
+        for registro in registros_frente:
+            arquivos.extend(gravar_resultado(saida, registro, manifesto))
+    return arquivos
+
+
+def gerar_vel_rpm(df, fazendas_base, parametros, saida, num_processos, manifesto, armazem=None):
+    if validar_colunas(df, COLUNAS_POR_MODO[MODO_VEL_RPM]["obrigatorias"]):
+        raise ValueError("O modo Velocidade/RPM precisa das colunas vl_velocidade e vl_rpm.")
+    coluna_linha = detectar_coluna_geometria(df, ["LINESTRING", "MULTILINESTRING"])
+    if coluna_linha is not None:
+        df_oper = filtrar_geometrias(df, coluna_linha, "LINESTRING")
+    else:
+        faltantes_pontos = validar_colunas(df, ["dt_hr_local_inicial", "vl_latitude_inicial", "vl_longitude_inicial", "cd_estado", "cd_operacao_parada", "cd_equipamento"])
+        if faltantes_pontos:
+            raise ValueError("Colunas obrigatórias faltantes para pontos: " + ", ".join(faltantes_pontos))
+        df_oper = filtrar_pontos_operacao(df)
+    if armazem:
+        df_oper, _ = processar_incremental(armazem, conjunto_armazem(MODO_VEL_RPM, pontos=coluna_linha is None), df_oper)
+        if df_oper is None:
+            return []
+    tarefas = tarefas_por_fazenda(df_oper, fazendas_base, coluna_linha, parametros, False)
+    arquivos = []
+    for resultado in executar_em_paralelo(processar_fazenda_vel_rpm, tarefas, num_processos):
+        if resultado is not None:
+            arquivos.extend(gravar_resultado(saida, resultado, manifesto))
+    return arquivos
+
+
+def gerar_mapas(pasta_zips, modo, saida, caminho_base=BASE_PADRAO_PATH, parametros=None, frente_fazendas=None, num_processos=None, armazem=None, dados=None, salvar_dados=None):
+    """Pipeline completo de um modo; devolve a lista de arquivos gravados (o manifesto.json por último).
+
+    Com `armazem` (pasta), os ZIPs entram no armazém incremental e os mapas saem do histórico guardado.
+    `dados` lê um GeoParquet exportado no lugar dos ZIPs; `salvar_dados` exporta o que foi lido dos ZIPs.
+    """
+    parametros = parametros or dict(PARAMETROS_PADRAO)
+    df = ler_entrada(pasta_zips, modo, dados, salvar_dados)
+    if "cd_fazenda" not in df.columns:
+        raise ValueError("Coluna obrigatória faltante: cd_fazenda")
+    base_cartografica = carregar_base_cartografica(caminho_base)
+    faltantes_gpkg = validar_colunas(base_cartografica["base"], ["FAZENDA", "PROPRIEDADE", "geometry"])
+    if faltantes_gpkg:
+        raise ValueError("O GPKG não possui as colunas obrigatórias: " + ", ".join(faltantes_gpkg))
+    fazendas_base = base_cartografica["fazendas"]
+    os.makedirs(saida, exist_ok=True)
+    manifesto = novo_manifesto(modo, parametros)
+    if modo == MODO_AREA:
+        arquivos = gerar_area(df, fazendas_base, parametros, saida, num_processos, manifesto, armazem)
+    elif modo == MODO_OPERADOR:
+        arquivos = gerar_operador(df, fazendas_base, parametros, frente_fazendas or {}, saida, num_processos, manifesto, armazem)
+    else:
+        arquivos = gerar_vel_rpm(df, fazendas_base, parametros, saida, num_processos, manifesto, armazem)
+    if arquivos:
+        arquivos.append(gravar(saida, "manifesto.json", manifesto_json(manifesto)))
+    return arquivos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gerar_mapas", description=__doc__.splitlines()[0])
+    entrada = parser.add_mutually_exclusive_group(required=True)
+    entrada.add_argument("--zips", help="pasta com os ZIPs da Solinftec")
+    entrada.add_argument("--dados", help="GeoParquet gravado com --salvar-dados, no lugar dos ZIPs")
+    parser.add_argument("--modo", required=True, choices=sorted(MODOS_CLI))
+    parser.add_argument("--saida", default="saida", help="pasta dos PDFs/CSVs gerados")
+    parser.add_argument("--base", default=BASE_PADRAO_PATH, help="GPKG da base cartográfica")
+    parser.add_argument("--parametros", help="JSON com os parâmetros da barra lateral (chaves de PARAMETROS_PADRAO)")
+    parser.add_argument("--frentes", help="JSON com as fazendas de F1/F2/F3 (modo operador)")
+    parser.add_argument("--processos", type=int, default=None, help="processos em paralelo (padrão: núcleos da máquina)")
+    parser.add_argument("--salvar-dados", help="grava os dados lidos dos ZIPs num GeoParquet para reabrir com --dados")
+    parser.add_argument("--armazem", nargs="?", const=PASTA_ARMAZEM, help=f"modo incremental: pasta do armazém Parquet (padrão: {PASTA_ARMAZEM})")
+    parser.add_argument("--desempenho", action="store_true", help="registra tempo, CPU e memória de cada etapa em linhas JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        parametros = montar_parametros(args.parametros)
+        frente_fazendas = montar_frentes(args.frentes)
+        with coletar_etapas() as registros, medir_etapa("execucao", modo=MODOS_CLI[args.modo]) as medida:
+            arquivos = gerar_mapas(args.zips, MODOS_CLI[args.modo], args.saida, args.base, parametros, frente_fazendas, args.processos, args.armazem, args.dados, args.salvar_dados)
+            medida["arquivos"] = len(arquivos)
+    except (ValueError, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    wkt_invalidos = contar_wkt_invalidos(registros)
+    if wkt_invalidos:
+        print(f"Aviso: {aviso_wkt_invalidos(wkt_invalidos)}", file=sys.stderr)
+    if args.desempenho:
+        configurar_log_desempenho()
+        registrar_etapas(registros, execucao=uuid.uuid4().hex, origem="cli", em=datetime.now().isoformat(timespec="seconds"))
+    for caminho in arquivos:
+        print(caminho)
+    if not arquivos:
+        print("Aviso: nenhum mapa gerado. Confira se o modo escolhido combina com os arquivos enviados.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
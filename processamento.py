@@ -0,0 +1,2289 @@
+import io
+import os
+import sys
+import json
+import logging
+import hashlib
+import pickle
+import re
+import glob
+import time
+import uuid
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import matplotlib.pyplot as plt
+import matplotlib.patches as mpatches
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.colors import LinearSegmentedColormap, to_hex
+import shapely
+from shapely.ops import unary_union
+from pyproj import Transformer
+import pyarrow.parquet as pq
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, o pico de RSS fica de fora.
+    resource = None
+from pypdf import PdfReader, PdfWriter
+import pytz
+
+# =========================================================
+# CONFIGURAÇÕES
+# =========================================================
+BASE_PADRAO_PATH = "base_cartografica/BaseCartografica_10_29_2025_SOLINFTEC.gpkg"
+CRS_METRICO = 31983
+TEMPO_MAX_SEG = 60
+LARGURA_PADRAO_M = 3.0
+PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+# Processos usados no laço por fazenda; AREA_TRABALHADA_PROCESSOS=1 força execução sequencial.
+NUM_PROCESSOS = int(os.environ.get("AREA_TRABALHADA_PROCESSOS") or 0) or os.cpu_count() or 1
+# Resolução da prévia na tela; o PDF vetorial continua sendo o arquivo de referência.
+# 90 dpi deixa a figura de 15,5" com menos de 1460 px, largura acima da qual o st.image
+# redimensiona e recodifica o PNG a cada rerun.
+PREVIA_DPI = 90
+# Mapas de cada sessão do app (PNG + PDF, ou o preparo sob demanda) guardados por fazenda, dados e parâmetros.
+MAX_MAPAS_EM_CACHE = 128
+# Fechamento da área trabalhada em blocos quadrados deste lado (m); ver fechar_area_trabalhada.
+BLOCO_AREA_M = 1500.0
+# Limite de mitra do shapely (join_style=2): o buffer avança até esse múltiplo da distância nos cantos.
+LIMITE_MITRE = 5.0
+# Armazém do modo incremental: registros já recebidos (Parquet) e área bruta de cada fazenda.
+PASTA_ARMAZEM = os.environ.get("AREA_TRABALHADA_ARMAZEM") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "armazem")
+CHAVE_REGISTRO = ["cd_equipamento", "dt_hr_local_inicial"]
+
+MODO_AREA = "Área trabalhada (área)"
+MODO_OPERADOR = "Colhedora/operador (linhas)"
+MODO_VEL_RPM = "Velocidade/RPM (linhas)"
+# Nome curto de cada modo em arquivos e pastas.
+CHAVE_MODO = {MODO_AREA: "area", MODO_OPERADOR: "colhedora_operador", MODO_VEL_RPM: "velocidade_rpm"}
+
+COLUNAS_GEOMETRIA = ["wkt", "WKT", "geometry", "GEOMETRY", "geom", "GEOM", "the_geom", "THE_GEOM", "linha", "LINHA", "line", "LINE"]
+COLUNAS_POR_MODO = {
+    MODO_AREA: {
+        "obrigatorias": ["cd_fazenda"],
+        "opcionais": ["cd_equipamento", "vl_largura_implemento", "dt_hr_local_inicial", "dt_hr_local_final"],
+    },
+    MODO_OPERADOR: {
+        "obrigatorias": ["cd_fazenda", "cd_equipamento", "cd_operador", "desc_operador", "dt_hr_local_inicial", "vl_largura_implemento"],
+        "opcionais": ["dt_hr_local_final"],
+    },
+    MODO_VEL_RPM: {
+        "obrigatorias": ["cd_fazenda", "vl_velocidade", "vl_rpm"],
+        "opcionais": [
+            "cd_equipamento", "cd_estado", "cd_operacao_parada", "vl_largura_implemento",
+            "vl_latitude_inicial", "vl_longitude_inicial", "dt_hr_local_inicial", "dt_hr_local_final",
+        ],
+    },
+}
+COLUNAS_COORDENADAS = ["vl_latitude_inicial", "vl_longitude_inicial"]
+COLUNAS_MEDICOES = ["vl_rpm", "vl_velocidade", "vl_largura_implemento"]
+COLUNAS_CODIGOS = ["cd_fazenda", "cd_equipamento", "cd_operador"]
+COLUNAS_CATEGORICAS = COLUNAS_CODIGOS + ["cd_estado", "cd_operacao_parada", "desc_operador"]
+COLUNAS_DATAS = ["dt_hr_local_inicial", "dt_hr_local_final"]
+PREFIXOS_TEXTO = ("cd_", "desc_", "dt_hr_local_")
+ORDEM_TURNOS = ["Turno C", "Turno A", "Turno B"]
+FRENTES = ["F1", "F2", "F3"]
+
+# Valores padrão dos parâmetros da barra lateral; os workers por fazenda recebem este dicionário.
+PARAMETROS_PADRAO = {
+    "MULTIPLICADOR_BUFFER_AREA": 2.5,
+    "AREA_MIN_HA": 0.50,
+    "BUFFER_MINIMO_M": 8.0,
+    "FATOR_RECUO_GAPS": 0.30,
+    "AREA_MAX_BURACO_HA": 0.50,
+    "SIMPLIFICAR_AREA_M": 0.0,
+    "MOSTRAR_TALHOES": False,
+    "AREA_MIN_OPERADOR_HA": 0.50,
+    "VEL_MIN": 4.0,
+    "VEL_MAX": 8.0,
+    "VEL_PASSO": 1.0,
+    "RPM_MIN": 1200,
+    "RPM_MAX": 2000,
+    "RPM_PASSO": 100,
+}
+
+_HASHES_ARQUIVOS = {}
+_BASES_CARREGADAS = {}
+_REGISTROS_ETAPAS = ContextVar("registros_etapas", default=None)
+LOG_DESEMPENHO = logging.getLogger("area_trabalhada.desempenho")
+
+# =========================================================
+# MEDIÇÃO DE ETAPAS
+# =========================================================
+# As etapas do pipeline (ingestao, normalizacao, geometria, recorte, buffer_uniao,
+# classificacao, figura, pdf...) e cada fazenda são medidas só dentro de
+# coletar_etapas(); fora dela medir_etapa não faz nada. Cada registro traz tempo de
+# relógio, CPU da thread, pico de RSS (e quanto ele cresceu na etapa) e as contagens
+# de linhas/geometrias informadas pela etapa.
+@contextmanager
+def coletar_etapas():
+    """Ativa a medição no contexto atual e entrega a lista que recebe os registros."""
+    registros = []
+    token = _REGISTROS_ETAPAS.set(registros)
+    try:
+        yield registros
+    finally:
+        _REGISTROS_ETAPAS.reset(token)
+
+
+def pico_rss_mb():
+    if resource is None:
+        return 0.0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+@contextmanager
+def medir_etapa(nome, **contagens):
+    """Mede o bloco; o dicionário entregue aceita contagens preenchidas durante a etapa."""
+    registros = _REGISTROS_ETAPAS.get()
+    if registros is None:
+        yield contagens
+        return
+    rss_inicio = pico_rss_mb()
+    inicio, cpu_inicio = time.perf_counter(), time.thread_time()
+    try:
+        yield contagens
+    finally:
+        rss_fim = pico_rss_mb()
+        registros.append({
+            "etapa": nome,
+            "segundos": time.perf_counter() - inicio,
+            "cpu_seg": time.thread_time() - cpu_inicio,
+            "rss_pico_mb": rss_fim,
+            "rss_delta_mb": rss_fim - rss_inicio,
+            **contagens,
+        })
+
+
+def resumir_etapas(registros, campo="etapa"):
+    """Soma tempos e contagens por etapa (ou por outro campo), na ordem da primeira ocorrência.
+
+    O crescimento do pico de RSS não é somável: fica o maior observado.
+    """
+    resumo = {}
+    for registro in registros:
+        if registro.get(campo) is None:
+            continue
+        item = resumo.setdefault(registro[campo], {"segundos": 0.0, "cpu_seg": 0.0, "rss_delta_mb": 0.0, "chamadas": 0})
+        item["chamadas"] += 1
+        for chave, valor in registro.items():
+            if chave == "rss_delta_mb":
+                item[chave] = max(item[chave], valor)
+            elif chave not in ("etapa", "fazenda", "rss_pico_mb") and isinstance(valor, (int, float)):
+                item[chave] = item.get(chave, 0) + valor
+    return resumo
+
+
+def tabela_etapas(registros):
+    """Resumo por etapa em DataFrame, sem os registros agregadores (execucao/fazenda)."""
+    etapas = [r for r in registros if r["etapa"] not in ("execucao", "fazenda")]
+    df = pd.DataFrame.from_dict(resumir_etapas(etapas), orient="index").rename_axis("etapa").reset_index()
+    return df.sort_values("segundos", ascending=False, ignore_index=True) if not df.empty else df
+
+
+def tabela_fazendas(registros):
+    """Uma linha por fazenda: tempo total da fazenda e segundos gastos em cada etapa."""
+    fazendas = [r for r in registros if r["etapa"] == "fazenda"]
+    if not fazendas:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_dict(resumir_etapas(fazendas, "fazenda"), orient="index")
+    df = df.drop(columns=["chamadas"]).rename_axis("fazenda")
+    etapas = pd.DataFrame([r for r in registros if r.get("fazenda") is not None and r["etapa"] != "fazenda"])
+    if not etapas.empty:
+        df = df.join(etapas.pivot_table(index="fazenda", columns="etapa", values="segundos", aggfunc="sum"))
+    return df.sort_values("segundos", ascending=False).reset_index()
+
+
+def contar_wkt_invalidos(registros):
+    """Linhas com WKT inválido descartadas nas etapas medidas (criar_gdf_wkt conta, medir_etapa guarda)."""
+    return int(sum(r.get("wkt_invalidos", 0) for r in registros))
+
+
+def aviso_wkt_invalidos(quantidade):
+    if quantidade == 1:
+        return "1 linha com geometria WKT inválida foi ignorada."
+    return f"{quantidade} linhas com geometria WKT inválida foram ignoradas."
+
+
+def configurar_log_desempenho(caminho=None):
+    """Linhas JSON de desempenho no stderr ou, com AREA_TRABALHADA_LOG_DESEMPENHO, num arquivo."""
+    if LOG_DESEMPENHO.handlers:
+        return
+    caminho = caminho or os.environ.get("AREA_TRABALHADA_LOG_DESEMPENHO")
+    handler = logging.FileHandler(caminho, encoding="utf-8") if caminho else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    LOG_DESEMPENHO.addHandler(handler)
+    LOG_DESEMPENHO.setLevel(logging.INFO)
+    LOG_DESEMPENHO.propagate = False
+
+
+def registrar_etapas(registros, **contexto):
+    """Emite um registro por linha, em JSON, com o contexto da execução (id, modo, origem...)."""
+    for registro in registros:
+        LOG_DESEMPENHO.info(json.dumps({**contexto, **registro}, ensure_ascii=False, default=str))
+
+# =========================================================
+# UTILITÁRIOS
+# =========================================================
+@lru_cache(maxsize=1)
+def transformador_metrico():
+    return Transformer.from_crs("EPSG:4326", f"EPSG:{CRS_METRICO}", always_xy=True)
+
+
+def guardar_lru(cache, chave, valor, limite):
+    """Guarda num OrderedDict como o item mais recente, descartando os mais antigos acima do limite."""
+    cache[chave] = valor
+    cache.move_to_end(chave)
+    while len(cache) > limite:
+        cache.popitem(last=False)
+
+
+def normalizar_codigo(valor):
+    if pd.isna(valor):
+        return ""
+    texto = str(valor).strip()
+    if texto.endswith(".0"):
+        texto = texto[:-2]
+    return texto
+
+
+def normalizar_codigos(serie):
+    """Mesmo critério de normalizar_codigo, aplicado à coluna inteira."""
+    nulos = serie.isna()
+    texto = serie.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    return texto.mask(nulos, "")
+
+
+def chave_ordenacao_mista(valor):
+    texto = str(valor).strip()
+    return re.sub(r"\d+", lambda m: f"{int(m.group()):010d}", texto)
+
+
+def slug_texto(valor):
+    texto = str(valor).strip()
+    texto = re.sub(r"[^A-Za-z0-9_-]+", "_", texto)
+    texto = texto.strip("_")
+    return texto or "item"
+
+
+def formatar_numero(valor, casas=0):
+    if pd.isna(valor):
+        return "-"
+    if casas == 0:
+        return f"{int(round(float(valor)))}"
+    return f"{float(valor):.{casas}f}".replace(".", ",")
+
+
+def formatar_area_ha(valor):
+    if pd.isna(valor):
+        return "-"
+    return f"{float(valor):.2f}".replace(".", ",") + " ha"
+
+
+def arredondar_para_baixo(valor, base):
+    # O quociente é arredondado antes: 1.5 / 0.1 dá 15.000000000000002 e o ceil iria para 16.
+    return np.round(np.floor(np.round(valor / base, 9)) * base, 9)
+
+
+def arredondar_para_cima(valor, base):
+    return np.round(np.ceil(np.round(valor / base, 9)) * base, 9)
+
+
+def validar_colunas(df, colunas):
+    return [c for c in colunas if c not in df.columns]
+
+
+def colunas_do_modo(modo=None):
+    """Colunas lidas dos CSVs num modo; sem modo, as de todos (dados normalizados exportados)."""
+    if modo is None:
+        return list(dict.fromkeys(c for m in COLUNAS_POR_MODO for c in colunas_do_modo(m)))
+    declaracao = COLUNAS_POR_MODO[modo]
+    return declaracao["obrigatorias"] + declaracao["opcionais"]
+
+
+def detectar_formato_csv(amostra):
+    """Separador e encoding a partir dos primeiros KB do arquivo.
+
+    O separador vem do cabeçalho (`;` tem preferência, como nas exportações da
+    Solinftec); o encoding é UTF-8 quando a amostra decodifica sem erro e latin1 caso
+    contrário. ler_csv_robusto volta para latin1 se o resto do arquivo não for UTF-8.
+    """
+    if amostra.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    else:
+        fim_linha = amostra.rfind(b"\n")
+        try:
+            (amostra[:fim_linha] if fim_linha > 0 else amostra).decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            encoding = "latin1"
+    cabecalho = amostra.split(b"\n", 1)[0].decode(encoding, errors="replace")
+    if ";" in cabecalho:
+        return ";", encoding
+    if "," in cabecalho:
+        return ",", encoding
+    raise ValueError("Separador do CSV não reconhecido (esperado ; ou ,).")
+
+
+def colunas_wkt_na_amostra(amostra, sep, encoding):
+    """Colunas da amostra cujos valores começam com um tipo de geometria WKT.
+
+    Cobre a geometria exportada com um nome fora de COLUNAS_GEOMETRIA, que
+    detectar_coluna_geometria acharia varrendo todas as colunas se ela fosse lida.
+    None quando a amostra não pode ser lida ou não traz nenhuma linha completa (aí o
+    arquivo é lido inteiro).
+    """
+    fim_linha = amostra.rfind(b"\n")
+    try:
+        df = pd.read_csv(io.BytesIO(amostra[:fim_linha] if fim_linha > 0 else amostra), sep=sep, encoding=encoding, encoding_errors="replace", dtype=str)
+    except (ValueError, pd.errors.ParserError):
+        return None
+    if df.empty:
+        return None
+    padrao = r"^\s*(?:MULTI)?(?:POINT|LINESTRING|POLYGON)\b"
+    return [
+        c for c in df.columns
+        if df[c].dropna().head(100).str.contains(padrao, case=False, regex=True).any()
+    ]
+
+
+def ler_csv_robusto(csv_path, colunas=None):
+    """Lê um CSV da Solinftec com uma única passada do parser C.
+
+    Aceita caminho ou arquivo aberto (membro de ZIP). `colunas` limita a leitura às
+    colunas usadas pelo modo e às candidatas a geometria (nomes conhecidos e colunas com
+    WKT na amostra); códigos, descrições e datas vêm como texto, coordenadas como float64
+    e medições como float32, sem inferência coluna a coluna.
+    """
+    if hasattr(csv_path, "read"):
+        amostra = csv_path.read(65536)
+        csv_path.seek(0)
+    else:
+        with open(csv_path, "rb") as f:
+            amostra = f.read(65536)
+    sep, encoding = detectar_formato_csv(amostra)
+    cabecalho = [c.strip().strip('"') for c in amostra.split(b"\n", 1)[0].decode(encoding, errors="replace").rstrip("\r").split(sep)]
+    if len(cabecalho) <= 1:
+        raise ValueError("CSV com uma única coluna.")
+    if colunas is not None:
+        colunas_wkt = colunas_wkt_na_amostra(amostra, sep, encoding)
+        if colunas_wkt is not None:
+            desejadas = set(colunas) | set(COLUNAS_GEOMETRIA) | {c.strip() for c in colunas_wkt}
+            cabecalho = [c for c in cabecalho if c in desejadas]
+        else:
+            colunas = None
+    tipos = {c: "str" for c in cabecalho if c.startswith(PREFIXOS_TEXTO)}
+    tipos.update({c: "float64" for c in cabecalho if c in COLUNAS_COORDENADAS})
+    tipos.update({c: "float32" for c in cabecalho if c in COLUNAS_MEDICOES})
+    leitura = {"sep": sep, "encoding": encoding, "usecols": cabecalho if colunas is not None else None}
+
+    def ler(tipos_leitura):
+        if hasattr(csv_path, "seek"):
+            csv_path.seek(0)
+        try:
+            return pd.read_csv(csv_path, dtype=tipos_leitura, **leitura)
+        except UnicodeDecodeError:
+            # A amostra era UTF-8, mas um byte mais adiante não é (exportação em latin1 com
+            # acentos só depois dos primeiros KB): latin1 decodifica qualquer byte.
+            if leitura["encoding"] == "latin1":
+                raise
+            leitura["encoding"] = "latin1"
+            if hasattr(csv_path, "seek"):
+                csv_path.seek(0)
+            return pd.read_csv(csv_path, dtype=tipos_leitura, **leitura)
+
+    try:
+        return ler(tipos)
+    except ValueError:
+        # Medição com texto no meio: lê sem forçar float e deixa o to_numeric tratar depois.
+        return ler({c: t for c, t in tipos.items() if t == "str"})
+
+
+def compactar_colunas(df):
+    """Códigos normalizados e colunas repetitivas como Categorical, datas já convertidas e
+    medições em float32."""
+    for col in COLUNAS_DATAS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            serie = normalizar_codigos(df[col]) if col in COLUNAS_CODIGOS else df[col]
+            df[col] = serie.astype("category")
+    for col in COLUNAS_MEDICOES:
+        if col in df.columns and df[col].dtype != "float32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    return df
+
+
+def concatenar_compactos(dfs):
+    """pd.concat que mantém as colunas Categorical (unindo as categorias em ordem)."""
+    dfs = [d for d in dfs if d is not None]
+    if len(dfs) > 1:
+        for col in COLUNAS_CATEGORICAS:
+            categorias = set()
+            for d in dfs:
+                if col in d.columns:
+                    categorias.update(d[col].cat.categories if isinstance(d[col].dtype, pd.CategoricalDtype) else d[col].dropna().unique())
+            categorias = sorted(categorias, key=str)
+            for i, d in enumerate(dfs):
+                if col in d.columns:
+                    dfs[i] = d.assign(**{col: pd.Categorical(d[col], categories=categorias)})
+    return pd.concat(dfs, ignore_index=True) if dfs else None
+
+
+def listar_csvs_zip(zf):
+    """Membros CSV do ZIP, decidido só pelo nome (nada é descompactado aqui)."""
+    membros = []
+    for info in zf.infolist():
+        nome = info.filename.replace("\\", "/")
+        base = nome.rsplit("/", 1)[-1]
+        if info.is_dir() or nome.startswith("__MACOSX/") or base.startswith("._"):
+            continue
+        if base.lower().endswith(".csv"):
+            membros.append(info)
+    return membros
+
+
+def ler_dados_zip(uploaded_zip, colunas=None):
+    """Lê todos os CSVs de um ZIP numa única passada, direto do arquivo compactado.
+
+    Aceita caminho ou arquivo em memória (upload do Streamlit). Cada membro CSV é
+    descompactado em fluxo para o leitor, sem extrair nada para disco; `colunas` é
+    repassado a ler_csv_robusto e cada CSV é compactado (compactar_colunas) antes da
+    concatenação, para o pico de memória acompanhar o dado já reduzido. Devolve
+    {"df": CSVs concatenados (ou None), "csvs": quantidade de CSVs, "erros": [...]}
+    para que quem chama decida como exibir os problemas.
+    """
+    try:
+        uploaded_zip.seek(0)
+    except Exception:
+        pass
+    dfs, erros = [], []
+    with zipfile.ZipFile(uploaded_zip, "r") as zf:
+        membros = listar_csvs_zip(zf)
+        for info in membros:
+            try:
+                with zf.open(info) as arquivo_csv, medir_etapa("ingestao") as medida:
+                    df_csv = ler_csv_robusto(arquivo_csv, colunas)
+                    medida["linhas"] = len(df_csv)
+                with medir_etapa("normalizacao", linhas=len(df_csv)):
+                    dfs.append(compactar_colunas(df_csv))
+            except Exception as e:
+                erros.append(f"Erro ao ler CSV {os.path.basename(info.filename)}: {e}")
+    with medir_etapa("normalizacao") as medida:
+        df = concatenar_compactos(dfs)
+        medida["linhas"] = 0 if df is None else len(df)
+    return {"df": df, "csvs": len(membros), "erros": erros}
+
+
+def coluna_e_geometria(serie):
+    """Coluna já com geometrias shapely (dados normalizados relidos do GeoParquet), não WKT."""
+    return isinstance(serie.dtype, gpd.array.GeometryDtype)
+
+
+def detectar_coluna_geometria(df, tipos):
+    tipos_upper = [t.upper() for t in tipos]
+    for col in COLUNAS_GEOMETRIA:
+        if col in df.columns:
+            serie = df[col].dropna().astype(str).head(100).str.upper()
+            if any(serie.str.contains(t, regex=False).any() for t in tipos_upper):
+                return col
+    for col in df.columns:
+        serie = df[col].dropna().astype(str).head(100).str.upper()
+        if not serie.empty and any(serie.str.contains(t, regex=False).any() for t in tipos_upper):
+            return col
+    return None
+
+
+def criar_gdf_wkt(df, coluna_wkt, crs="EPSG:4326"):
+    """GeoDataFrame com as linhas de WKT válido, lidas em lote pelo shapely.
+
+    Textos vazios ou ausentes são ignorados; os que não são WKT válido também, mas ficam
+    contados em gdf.attrs["wkt_invalidos"]. Uma coluna que já traz geometrias (dados
+    normalizados do GeoParquet) é usada direto, sem passar pelo WKT.
+    """
+    if coluna_wkt is None or coluna_wkt not in df.columns:
+        return gpd.GeoDataFrame(columns=list(df.columns) + ["geometry"], geometry="geometry", crs=crs)
+    textos = df[coluna_wkt]
+    if coluna_e_geometria(textos):
+        df = df.drop(columns=[coluna_wkt])
+        geoms = np.asarray(textos.array, dtype=object)
+        ausentes = pd.isna(geoms)
+        invalidos = 0
+    else:
+        geoms = shapely.from_wkt(textos.to_numpy(dtype=object, na_value=None), on_invalid="ignore")
+        ausentes = pd.isna(geoms)
+        nao_lidos = textos[ausentes]
+        invalidos = int((nao_lidos.notna() & (nao_lidos.astype(str).str.strip() != "")).sum())
+    validos = ~ausentes & ~shapely.is_empty(geoms)
+    if not validos.any():
+        gdf = gpd.GeoDataFrame(columns=list(df.columns) + ["geometry"], geometry="geometry", crs=crs)
+    else:
+        gdf = gpd.GeoDataFrame(df if validos.all() else df[validos], geometry=geoms[validos], crs=crs)
+    gdf.attrs["wkt_invalidos"] = invalidos
+    return gdf
+
+
+def preencher_buracos_pequenos(geom, area_max_buraco_m2=5000):
+    """Tira de um Polygon/MultiPolygon os buracos com área até `area_max_buraco_m2`.
+
+    As áreas de todos os anéis internos saem em lote e cada polígono é remontado uma vez,
+    só com os buracos mantidos. As partes de um MultiPolygon já são disjuntas; a única
+    sobreposição possível é uma ilha dentro de um buraco preenchido, e essa ilha é
+    descartada (o buraco preenchido já a cobre), sem união entre as partes.
+    """
+    if geom is None or geom.is_empty or geom.geom_type not in ("Polygon", "MultiPolygon"):
+        return geom
+    poligonos = shapely.get_parts(geom)
+    num_aneis = shapely.get_num_interior_rings(poligonos)
+    if not num_aneis.any():
+        return geom
+    dono = np.repeat(np.arange(len(poligonos)), num_aneis)
+    posicao = np.arange(len(dono)) - np.repeat(np.cumsum(num_aneis) - num_aneis, num_aneis)
+    aneis = shapely.get_interior_ring(poligonos[dono], posicao)
+    buracos = shapely.polygons(aneis)
+    manter = shapely.area(buracos) > area_max_buraco_m2
+    if manter.all():
+        return geom
+    # Anéis de cada polígono em sequência (externo, depois os buracos mantidos) e remontagem em lote.
+    aneis_mantidos, dono_mantido = aneis[manter], dono[manter]
+    ordem = np.argsort(np.concatenate([np.arange(len(poligonos)), dono_mantido]), kind="stable")
+    todos_aneis = np.concatenate([shapely.get_exterior_ring(poligonos), aneis_mantidos])[ordem]
+    indices = np.concatenate([np.arange(len(poligonos)), dono_mantido])[ordem]
+    poligonos = shapely.polygons(todos_aneis, indices=indices)
+    if len(poligonos) == 1:
+        return poligonos[0]
+    preenchidos = buracos[~manter]
+    ilhas = shapely.STRtree(preenchidos).query(poligonos, predicate="within")[0]
+    if len(ilhas):
+        poligonos = np.delete(poligonos, np.unique(ilhas))
+    return shapely.multipolygons(poligonos) if len(poligonos) > 1 else poligonos[0]
+
+
+def obter_periodo(df1=None, df2=None):
+    candidatos = []
+    for df_tmp in [df1, df2]:
+        if df_tmp is None or df_tmp.empty:
+            continue
+        for col in ["dt_hr_local_inicial", "dt_hr_local_final"]:
+            if col in df_tmp.columns:
+                vals = pd.to_datetime(df_tmp[col], errors="coerce").dropna()
+                if not vals.empty:
+                    candidatos.append(vals)
+    if not candidatos:
+        return "-", "-"
+    datas = pd.concat(candidatos)
+    return datas.min().strftime("%d/%m/%Y %H:%M"), datas.max().strftime("%d/%m/%Y %H:%M")
+
+
+def calcular_largura_media(df):
+    if df is None or df.empty or "vl_largura_implemento" not in df.columns:
+        return np.nan
+    s = pd.to_numeric(df["vl_largura_implemento"], errors="coerce").dropna()
+    s = s[s > 0]
+    return float(s.mean()) if not s.empty else np.nan
+
+
+def classificar_turnos(serie_datas):
+    """classificar_turno para a coluna inteira, devolvendo um Categorical em ORDEM_TURNOS."""
+    horas = pd.to_datetime(serie_datas, errors="coerce").dt.hour
+    turnos = np.select([horas < 6, horas < 15, horas.notna()], ["Turno C", "Turno A", "Turno B"], default=None)
+    return pd.Series(pd.Categorical(turnos, categories=ORDEM_TURNOS), index=serie_datas.index)
+
+
+def classificar_turno(dt):
+    if pd.isna(dt):
+        return None
+    hora = pd.to_datetime(dt).hour
+    if 0 <= hora < 6:
+        return "Turno C"
+    if 6 <= hora < 15:
+        return "Turno A"
+    return "Turno B"
+
+
+def intervalo_turno(turno):
+    return {
+        "Turno C": "00:00 às 06:00",
+        "Turno A": "06:00 às 15:00",
+        "Turno B": "15:00 às 23:59",
+    }.get(turno, "")
+
+
+def ordenar_tabela_talhoes(df_talhoes):
+    if df_talhoes is None or df_talhoes.empty:
+        return df_talhoes
+    df = df_talhoes.copy()
+    if "Gleba" not in df.columns or "Talhão" not in df.columns:
+        return df
+    df_total = df[df["Gleba"].astype(str).str.upper() == "TOTAL"].copy()
+    df_dados = df[df["Gleba"].astype(str).str.upper() != "TOTAL"].copy()
+    df_dados["_ord_gleba"] = df_dados["Gleba"].apply(chave_ordenacao_mista)
+    df_dados["_ord_talhao"] = df_dados["Talhão"].apply(chave_ordenacao_mista)
+    df_dados = df_dados.sort_values(["_ord_gleba", "_ord_talhao"]).drop(columns=["_ord_gleba", "_ord_talhao"])
+    if not df_total.empty:
+        return pd.concat([df_dados, df_total], ignore_index=True)
+    return df_dados.reset_index(drop=True)
+
+
+def preparar_tabela_talhoes_exportacao(df_talhoes):
+    if df_talhoes is None or df_talhoes.empty:
+        return pd.DataFrame()
+    df_exp = ordenar_tabela_talhoes(df_talhoes)
+    colunas = ["Gleba", "Talhão", "Área total (ha)", "Área trabalhada (ha)"]
+    colunas = [c for c in colunas if c in df_exp.columns]
+    df_exp = df_exp[colunas].copy()
+    for col in ["Área total (ha)", "Área trabalhada (ha)"]:
+        if col in df_exp.columns:
+            df_exp[col] = pd.to_numeric(df_exp[col], errors="coerce").fillna(0).round(2)
+            df_exp[col] = df_exp[col].apply(formatar_area_ha)
+    return df_exp
+
+
+def csv_talhoes_bytes(df_talhoes_exibicao):
+    return df_talhoes_exibicao.to_csv(index=False, sep=";").encode("utf-8-sig")
+
+
+def criar_zip_csv_talhoes(df_talhoes_exibicao, nome_csv):
+    buffer_zip = io.BytesIO()
+    csv_bytes = csv_talhoes_bytes(df_talhoes_exibicao)
+    with zipfile.ZipFile(buffer_zip, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr(nome_csv, csv_bytes)
+    buffer_zip.seek(0)
+    return buffer_zip.getvalue()
+
+# =========================================================
+# DADOS NORMALIZADOS (GEOPARQUET)
+# =========================================================
+# O resultado da leitura dos ZIPs (códigos normalizados, datas convertidas) pode ser
+# exportado com o WKT já lido: a geometria vai em WKB e as colunas Categorical viram
+# dicionários do Parquet. Relido, o mesmo conjunto serve para qualquer modo ou
+# parâmetro sem passar de novo pelos CSVs nem pelo WKT.
+def gravar_parquet(df, caminho):
+    """Grava num temporário e renomeia: uma execução interrompida não deixa arquivo pela metade.
+
+    Colunas de geometria saem em WKB, no formato GeoParquet.
+    """
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    geometrias = [c for c in df.columns if coluna_e_geometria(df[c])]
+    if geometrias and not isinstance(df, gpd.GeoDataFrame):
+        df = gpd.GeoDataFrame(df, geometry=geometrias[0])
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+def ler_parquet(caminho, colunas=None):
+    """DataFrame de um Parquet gravado por gravar_parquet, com as geometrias já como shapely.
+
+    Aceita caminho ou arquivo aberto; `colunas` limita a leitura (as que não existem no arquivo são ignoradas).
+    """
+    esquema = pq.read_schema(caminho)
+    if hasattr(caminho, "seek"):
+        caminho.seek(0)
+    if colunas is not None:
+        colunas = [c for c in esquema.names if c in set(colunas)]
+    if esquema.metadata and b"geo" in esquema.metadata:
+        try:
+            return pd.DataFrame(gpd.read_parquet(caminho, columns=colunas))
+        except ValueError:  # Nenhuma coluna de geometria entre as pedidas.
+            pass
+    return pd.read_parquet(caminho, columns=colunas)
+
+
+def salvar_dados_normalizados(df, caminho):
+    """Grava os dados lidos dos ZIPs como GeoParquet, com a coluna de geometria em WKB.
+
+    O WKT inválido fica como geometria ausente. Devolve o nome da coluna de geometria
+    (None quando não há nenhuma).
+    """
+    coluna = detectar_coluna_geometria(df, ["POLYGON", "LINESTRING"])
+    with medir_etapa("geoparquet", linhas=len(df)) as medida:
+        if coluna is not None and not coluna_e_geometria(df[coluna]):
+            geoms = shapely.from_wkt(df[coluna].to_numpy(dtype=object, na_value=None), on_invalid="ignore")
+            df = df.assign(**{coluna: gpd.array.from_shapely(geoms, crs="EPSG:4326")})
+            medida["geometrias"] = int((~pd.isna(geoms)).sum())
+        gravar_parquet(df, caminho)
+    return coluna
+
+
+def ler_dados_normalizados(arquivo, colunas=None):
+    """Relê um GeoParquet de salvar_dados_normalizados no formato de ler_dados_zip.
+
+    Aceita caminho ou arquivo em memória; `colunas` funciona como em ler_csv_robusto.
+    Os dados já foram compactados antes de salvar: dicionários voltam como Categorical
+    e as datas como datetime, sem nova normalização.
+    """
+    desejadas = None if colunas is None else set(colunas) | set(COLUNAS_GEOMETRIA)
+    try:
+        with medir_etapa("ingestao") as medida:
+            df = ler_parquet(arquivo, desejadas)
+            medida["linhas"] = len(df)
+    except Exception as e:
+        return {"df": None, "csvs": 1, "erros": [f"Erro ao ler {os.path.basename(str(getattr(arquivo, 'name', arquivo)))}: {e}"]}
+    return {"df": df, "csvs": 1, "erros": []}
+
+
+# =========================================================
+# BASE CARTOGRÁFICA
+# =========================================================
+def hash_arquivo(caminho):
+    """SHA-1 do arquivo, recalculado só quando muda o mtime ou o tamanho."""
+    info = os.stat(caminho)
+    chave = (os.path.abspath(caminho), info.st_mtime_ns, info.st_size)
+    if chave not in _HASHES_ARQUIVOS:
+        sha = hashlib.sha1()
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                sha.update(bloco)
+        _HASHES_ARQUIVOS[chave] = sha.hexdigest()
+    return _HASHES_ARQUIVOS[chave]
+
+
+def indexar_base_por_fazenda(base):
+    """Recorte, geometria unida, área e nome de cada FAZENDA, para acesso direto por código."""
+    fazendas = {}
+    if "FAZENDA" not in base.columns:
+        return fazendas
+    for fazenda_id, base_fazenda in base.groupby("FAZENDA", sort=False):
+        geom_fazenda = unary_union(base_fazenda.geometry)
+        nome = base_fazenda["PROPRIEDADE"].iloc[0] if "PROPRIEDADE" in base_fazenda.columns else ""
+        fazendas[fazenda_id] = {"base": base_fazenda, "geom": geom_fazenda, "nome": nome, "area_ha": geom_fazenda.area / 10000}
+    return fazendas
+
+
+def carregar_base_cartografica(caminho=BASE_PADRAO_PATH):
+    """Lê o GPKG uma vez por versão do arquivo e devolve a base já tratada e indexada.
+
+    A base volta normalizada (FAZENDA/TALHAO/GLEBA) e no CRS métrico, junto com o índice
+    de indexar_base_por_fazenda. O resultado fica em memória (chave: caminho + mtime +
+    hash) e em disco em PASTA_CACHE, então só a primeira leitura de cada versão do GPKG
+    paga o read_file, a normalização e as uniões por fazenda.
+    """
+    info = os.stat(caminho)
+    sha = hash_arquivo(caminho)
+    chave = (os.path.abspath(caminho), info.st_mtime_ns, sha)
+    if chave in _BASES_CARREGADAS:
+        return _BASES_CARREGADAS[chave]
+
+    caminho_cache = os.path.join(PASTA_CACHE, f"base_{sha}.pkl")
+    base_cartografica = None
+    if os.path.exists(caminho_cache):
+        try:
+            with open(caminho_cache, "rb") as f:
+                base_cartografica = pickle.load(f)
+        except Exception:
+            base_cartografica = None
+    if base_cartografica is None:
+        with medir_etapa("base_cartografica") as medida:
+            base = gpd.read_file(caminho)
+            medida["geometrias"] = len(base)
+            for col in ["FAZENDA", "TALHAO", "GLEBA"]:
+                if col in base.columns:
+                    base[col] = normalizar_codigos(base[col])
+            base = base.to_crs(epsg=CRS_METRICO)
+            base_cartografica = {"chave": sha, "base": base, "fazendas": indexar_base_por_fazenda(base)}
+        # Como em gravar_parquet: temporário e os.replace, para que outro processo nunca leia um pickle pela metade.
+        temporario = f"{caminho_cache}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(PASTA_CACHE, exist_ok=True)
+            with open(temporario, "wb") as f:
+                pickle.dump(base_cartografica, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho_cache)
+        except OSError:
+            with suppress(OSError):
+                os.remove(temporario)
+
+    for chave_antiga in [c for c in _BASES_CARREGADAS if c[0] == chave[0]]:
+        del _BASES_CARREGADAS[chave_antiga]
+    _BASES_CARREGADAS[chave] = base_cartografica
+    return base_cartografica
+
+
+# =========================================================
+# CLASSIFICAÇÃO DE VELOCIDADE/RPM
+# =========================================================
+def gerar_faixas(vmin, vmax, passo, casas=0):
+    inicio = arredondar_para_baixo(vmin, passo)
+    fim = arredondar_para_cima(vmax, passo)
+    # Limites contados em passos inteiros e o último fixado em `fim`: o np.arange em float
+    # podia criar um limite além do fim e deixar as faixas fora de ordem.
+    n_faixas = int(round((fim - inicio) / passo))
+    edges = np.round(inicio + np.arange(n_faixas + 1) * passo, 9)
+    edges[-1] = fim
+    faixas = []
+    label_under = f"< {int(inicio)}" if casas == 0 else f"< {inicio:.{casas}f}".replace(".", ",")
+    faixas.append((-np.inf, inicio, label_under))
+    for i in range(len(edges) - 1):
+        a, b = edges[i], edges[i + 1]
+        label = f"{int(a)} a {int(b)}" if casas == 0 else f"{a:.{casas}f} a {b:.{casas}f}".replace(".", ",")
+        faixas.append((a, b, label))
+    label_over = f"{int(fim)}+" if casas == 0 else f"{fim:.{casas}f}+".replace(".", ",")
+    faixas.append((fim, np.inf, label_over))
+    return faixas
+
+
+def classificar_faixas(valores, faixas):
+    """Categorical com o rótulo da faixa de cada valor (NaN fica sem classe), de uma vez só.
+
+    As faixas de gerar_faixas são contíguas e fechadas embaixo: [a, b).
+    """
+    valores = pd.to_numeric(pd.Series(valores), errors="coerce").to_numpy(dtype="float64")
+    limites = np.array([a for a, _, _ in faixas[1:]], dtype="float64")
+    codigos = np.digitize(valores, limites)
+    codigos[np.isnan(valores)] = -1
+    return pd.Categorical.from_codes(codigos, categories=[label for _, _, label in faixas])
+
+
+def criar_cmap_suave(tipo="vel"):
+    if tipo == "rpm":
+        cores = ["#0B4F8A", "#1F78B4", "#2D9CDB", "#1FBBA6", "#20B15A", "#8FD14F", "#F2C94C", "#F2994A", "#E05A47"]
+    else:
+        cores = ["#0A5E8A", "#1479C9", "#16A5C8", "#18B7B2", "#1DBE6B", "#86D44E", "#DCEB46", "#F4C542", "#F59E32", "#E1594F"]
+    return LinearSegmentedColormap.from_list(f"cmap_{tipo}", cores, N=256)
+
+
+def amostrar_cores_classes(cmap, n_classes):
+    if n_classes <= 1:
+        return [to_hex(cmap(0.55))]
+    pontos = np.linspace(0.10, 0.98, n_classes)
+    return [to_hex(cmap(x)) for x in pontos]
+
+
+def calcular_legenda_percentual(gdf_linhas, coluna_classe, faixas, mapa_cores):
+    if gdf_linhas is None or gdf_linhas.empty or coluna_classe not in gdf_linhas.columns:
+        return pd.DataFrame(columns=["cor", "faixa", "percentual"])
+    labels = [label for _, _, label in faixas]
+    codigos = pd.Categorical(gdf_linhas[coluna_classe], categories=labels).codes
+    classificados = codigos >= 0
+    if not classificados.any():
+        return pd.DataFrame(columns=["cor", "faixa", "percentual"])
+    codigos = codigos[classificados]
+    # Percentual do tempo em cada faixa; sem duração válida, percentual das linhas.
+    pesos = None
+    if "duracao_seg" in gdf_linhas.columns:
+        pesos = gdf_linhas["duracao_seg"].to_numpy(dtype="float64", na_value=np.nan)[classificados]
+        pesos = np.nan_to_num(pesos, nan=0.0)
+        if pesos.sum() <= 0:
+            pesos = None
+    totais = np.bincount(codigos, weights=pesos, minlength=len(labels))
+    return pd.DataFrame({
+        "cor": [mapa_cores.get(label, "#cccccc") for label in labels],
+        "faixa": labels,
+        "percentual": totais / totais.sum() * 100,
+    })
+
+
+def classificar_vel_rpm(gdf_plot, df_faz, parametros):
+    """Classes, cores, legenda e textos de faixa/média dos mapas de velocidade e RPM.
+
+    Grava as colunas classe_vel/classe_rpm em gdf_plot.
+    """
+    vel_min, vel_max, vel_passo = parametros["VEL_MIN"], parametros["VEL_MAX"], parametros["VEL_PASSO"]
+    vel_faixas = gerar_faixas(vel_min, vel_max, vel_passo, casas=1)
+    vel_labels = [f[2] for f in vel_faixas]
+    vel_cores = dict(zip(vel_labels, amostrar_cores_classes(criar_cmap_suave("vel"), len(vel_labels))))
+    gdf_plot["classe_vel"] = classificar_faixas(gdf_plot["vel_media"], vel_faixas)
+    df_leg_vel = calcular_legenda_percentual(gdf_plot, "classe_vel", vel_faixas, vel_cores)
+    vel_validos = pd.to_numeric(df_faz["vl_velocidade"], errors="coerce").dropna()
+    vel_med = round(vel_validos.mean(), 1) if not vel_validos.empty else np.nan
+
+    rpm_min, rpm_max, rpm_passo = parametros["RPM_MIN"], parametros["RPM_MAX"], parametros["RPM_PASSO"]
+    rpm_faixas = gerar_faixas(rpm_min, rpm_max, rpm_passo, casas=0)
+    rpm_labels = [f[2] for f in rpm_faixas]
+    rpm_cores = dict(zip(rpm_labels, amostrar_cores_classes(criar_cmap_suave("rpm"), len(rpm_labels))))
+    gdf_plot["classe_rpm"] = classificar_faixas(gdf_plot["rpm_medio"], rpm_faixas)
+    df_leg_rpm = calcular_legenda_percentual(gdf_plot, "classe_rpm", rpm_faixas, rpm_cores)
+    rpm_validos = pd.to_numeric(df_faz["vl_rpm"], errors="coerce").dropna()
+    rpm_med = round(rpm_validos.mean(), 0) if not rpm_validos.empty else np.nan
+
+    faixa_ini = arredondar_para_baixo(vel_min, vel_passo)
+    faixa_fim = arredondar_para_cima(vel_max, vel_passo)
+    faixa_ini_rpm = int(arredondar_para_baixo(rpm_min, rpm_passo))
+    faixa_fim_rpm = int(arredondar_para_cima(rpm_max, rpm_passo))
+    return {
+        "vel": {
+            "cores": vel_cores,
+            "legenda": df_leg_vel,
+            "media": vel_med,
+            "faixa_txt": f"< {formatar_numero(faixa_ini, 1)} | {formatar_numero(faixa_ini, 1)} até {formatar_numero(faixa_fim, 1)}+ km/h",
+            "media_txt": f"Vel. média: {formatar_numero(vel_med, 1)} km/h",
+        },
+        "rpm": {
+            "cores": rpm_cores,
+            "legenda": df_leg_rpm,
+            "media": rpm_med,
+            "faixa_txt": f"< {faixa_ini_rpm} | {faixa_ini_rpm} até {faixa_fim_rpm}+",
+            "media_txt": f"RPM médio: {formatar_numero(rpm_med, 0)}",
+        },
+    }
+
+# =========================================================
+# LINHAS / PONTOS
+# =========================================================
+def media_por_segmento(valores, inicios):
+    """Média por segmento ignorando NaN (equivalente a np.nanmean em cada trecho)."""
+    valores = np.asarray(valores, dtype="float64")
+    validos = ~np.isnan(valores)
+    somas = np.add.reduceat(np.where(validos, valores, 0.0), inicios)
+    contagens = np.add.reduceat(validos.astype("int64"), inicios)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(contagens > 0, somas / contagens, np.nan)
+
+
+def segmentar_pontos(df_pts, tempo_max_seg=TEMPO_MAX_SEG):
+    """Transforma pontos em trechos contínuos por equipamento, sem laço por linha.
+
+    Ordena uma única vez por equipamento/horário, quebra o trecho quando o intervalo entre
+    pontos passa de `tempo_max_seg` e monta todas as LineStrings de uma vez no CRS métrico.
+    """
+    vazio = gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    if df_pts is None or df_pts.empty or validar_colunas(df_pts, ["cd_equipamento", "dt_hr_local_inicial", "vl_longitude_inicial", "vl_latitude_inicial"]):
+        return vazio
+    equipamentos, _ = pd.factorize(df_pts["cd_equipamento"], sort=True)
+    tempos = pd.to_datetime(df_pts["dt_hr_local_inicial"], errors="coerce")
+    lon = pd.to_numeric(df_pts["vl_longitude_inicial"], errors="coerce").to_numpy(dtype="float64")
+    lat = pd.to_numeric(df_pts["vl_latitude_inicial"], errors="coerce").to_numpy(dtype="float64")
+    validos = (equipamentos >= 0) & tempos.notna().to_numpy() & np.isfinite(lon) & np.isfinite(lat)
+    if validos.sum() < 2:
+        return vazio
+    segundos = (tempos[validos] - tempos[validos].min()).dt.total_seconds().to_numpy()
+    equipamentos = equipamentos[validos]
+    ordem = np.lexsort((segundos, equipamentos))
+    segundos, equipamentos = segundos[ordem], equipamentos[ordem]
+    lon, lat = lon[validos][ordem], lat[validos][ordem]
+
+    novo_trecho = np.ones(len(ordem), dtype=bool)
+    novo_trecho[1:] = (equipamentos[1:] != equipamentos[:-1]) | (np.diff(segundos) > tempo_max_seg)
+    inicios = np.flatnonzero(novo_trecho)
+    tamanhos = np.diff(np.append(inicios, len(ordem)))
+    id_trecho = np.cumsum(novo_trecho) - 1
+
+    medias = {}
+    for coluna, saida in [("vl_rpm", "rpm_medio"), ("vl_velocidade", "vel_media")]:
+        if coluna in df_pts.columns:
+            valores = pd.to_numeric(df_pts[coluna], errors="coerce").to_numpy(dtype="float64")[validos][ordem]
+            medias[saida] = media_por_segmento(valores, inicios)
+        else:
+            medias[saida] = np.full(len(inicios), np.nan)
+    duracao = segundos[inicios + tamanhos - 1] - segundos[inicios]
+
+    trechos_validos = tamanhos >= 2
+    if not trechos_validos.any():
+        return vazio
+    pontos_validos = trechos_validos[id_trecho]
+    renumeracao = np.cumsum(trechos_validos) - 1
+    x, y = transformador_metrico().transform(lon[pontos_validos], lat[pontos_validos])
+    linhas = shapely.linestrings(np.column_stack([x, y]), indices=renumeracao[id_trecho[pontos_validos]])
+
+    gdf = gpd.GeoDataFrame({
+        "geometry": linhas,
+        "rpm_medio": medias["rpm_medio"][trechos_validos],
+        "vel_media": medias["vel_media"][trechos_validos],
+        "duracao_seg": duracao[trechos_validos],
+        "largura_media": LARGURA_PADRAO_M,
+    }, geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    return gdf[shapely.length(linhas) > 0].reset_index(drop=True)
+
+
+def clipar_na_fazenda(geoms, geom_fazenda):
+    """Recorta um GeoSeries pela fazenda pagando a interseção só no que cruza o limite.
+
+    A geometria da fazenda é preparada uma vez; o que está inteiramente dentro é mantido
+    como está, o que não toca a fazenda vira nulo e só as geometrias de borda passam por
+    uma interseção em lote.
+    """
+    valores = np.asarray(geoms.values, dtype=object)
+    recorte = np.full(len(valores), None, dtype=object)
+    if len(valores) == 0 or geom_fazenda is None or geom_fazenda.is_empty:
+        return gpd.GeoSeries(recorte, index=geoms.index, crs=geoms.crs)
+    shapely.prepare(geom_fazenda)
+    idx_toca = np.flatnonzero(shapely.intersects(geom_fazenda, valores))
+    dentro = shapely.contains_properly(geom_fazenda, valores[idx_toca])
+    recorte[idx_toca[dentro]] = valores[idx_toca[dentro]]
+    idx_borda = idx_toca[~dentro]
+    if len(idx_borda):
+        recorte[idx_borda] = shapely.intersection(valores[idx_borda], geom_fazenda)
+    return gpd.GeoSeries(recorte, index=geoms.index, crs=geoms.crs)
+
+
+def explodir_linhas(gdf):
+    """Mantém só o resultado linear do recorte, uma parte com comprimento por linha."""
+    gdf = gdf[gdf.geom_type.isin(["LineString", "MultiLineString"]) & ~gdf.is_empty]
+    gdf = gdf.explode(index_parts=False)
+    return gdf[~gdf.is_empty & (gdf.length > 0)].reset_index(drop=True)
+
+
+def criar_linhas_por_pontos(df_faz, geom_fazenda):
+    with medir_etapa("geometria", linhas=len(df_faz)) as medida:
+        gdf = segmentar_pontos(df_faz)
+        medida["geometrias"] = len(gdf)
+    if gdf.empty:
+        return gdf
+    with medir_etapa("recorte", linhas=len(gdf)) as medida:
+        gdf["geometry"] = clipar_na_fazenda(gdf.geometry, geom_fazenda)
+        gdf = explodir_linhas(gdf)
+        medida["geometrias"] = len(gdf)
+    return gdf
+
+
+def criar_linhas_por_wkt(df_faz, coluna_linha, geom_fazenda):
+    vazio = gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    with medir_etapa("geometria", linhas=len(df_faz)) as medida:
+        gdf = criar_gdf_wkt(df_faz, coluna_linha, crs="EPSG:4326")
+        medida["geometrias"] = len(gdf)
+        medida["wkt_invalidos"] = gdf.attrs["wkt_invalidos"]
+        if gdf.empty:
+            return vazio
+        gdf = gdf.to_crs(epsg=CRS_METRICO)
+    with medir_etapa("recorte", linhas=len(gdf)) as medida:
+        gdf["geometry"] = clipar_na_fazenda(gdf.geometry, geom_fazenda)
+        gdf = explodir_linhas(gdf)
+        medida["geometrias"] = len(gdf)
+    if gdf.empty:
+        return vazio
+    gdf["rpm_medio"] = pd.to_numeric(gdf["vl_rpm"], errors="coerce") if "vl_rpm" in gdf.columns else np.nan
+    gdf["vel_media"] = pd.to_numeric(gdf["vl_velocidade"], errors="coerce") if "vl_velocidade" in gdf.columns else np.nan
+    gdf["duracao_seg"] = np.nan
+    if "dt_hr_local_inicial" in gdf.columns and "dt_hr_local_final" in gdf.columns:
+        t1 = pd.to_datetime(gdf["dt_hr_local_inicial"], errors="coerce")
+        t2 = pd.to_datetime(gdf["dt_hr_local_final"], errors="coerce")
+        gdf["duracao_seg"] = (t2 - t1).dt.total_seconds()
+    if "vl_largura_implemento" in gdf.columns:
+        largura = pd.to_numeric(gdf["vl_largura_implemento"], errors="coerce")
+        gdf["largura_media"] = largura.where(largura > 0, LARGURA_PADRAO_M)
+    else:
+        gdf["largura_media"] = LARGURA_PADRAO_M
+    return gdf
+
+
+def criar_area_colhedora_por_linhas(df_faz, coluna_linha, geom_fazenda):
+    with medir_etapa("geometria", linhas=len(df_faz)) as medida:
+        gdf = criar_gdf_wkt(df_faz, coluna_linha, crs="EPSG:4326")
+        medida["geometrias"] = len(gdf)
+        medida["wkt_invalidos"] = gdf.attrs["wkt_invalidos"]
+        if gdf.empty:
+            return gpd.GeoDataFrame(columns=["cd_equipamento", "geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}"), pd.DataFrame()
+        gdf = gdf.to_crs(epsg=CRS_METRICO)
+    with medir_etapa("buffer_uniao", linhas=len(gdf)):
+        return agrupar_area_por_colhedora(gdf, geom_fazenda)
+
+
+def rotulos_operadores(df):
+    """"código - nome" de cada linha com operador, vazio onde não há nenhum dos dois.
+
+    Só o código (ou só o nome) quando falta o outro; um nome ausente nunca vira "nan" na legenda.
+    """
+    if "cd_operador" not in df.columns or "desc_operador" not in df.columns:
+        return pd.Series("", index=df.index)
+    cd = normalizar_codigos(df["cd_operador"].astype(object))
+    desc = df["desc_operador"].astype(object).where(df["desc_operador"].notna(), "").astype(str).str.strip()
+    rotulos = cd.str.cat(desc, sep=" - ")
+    return rotulos.where((cd != "") & (desc != ""), cd + desc)
+
+
+def uniao_por_grupo(geoms, grupos):
+    """União das geometrias de cada grupo (códigos 0..n-1) numa única chamada do shapely.
+
+    As geometrias vão para uma matriz grupo × posição completada com None, que o
+    union_all ignora, e a união corre ao longo das linhas; devolve os grupos presentes
+    (em ordem) e a união de cada um.
+    """
+    ordem = np.argsort(grupos, kind="stable")
+    presentes, inicios, contagens = np.unique(grupos[ordem], return_index=True, return_counts=True)
+    matriz = np.full((len(presentes), contagens.max()), None, dtype=object)
+    matriz[np.repeat(np.arange(len(presentes)), contagens), np.arange(len(ordem)) - np.repeat(inicios, contagens)] = geoms[ordem]
+    return presentes, shapely.union_all(matriz, axis=1)
+
+
+def agrupar_area_por_colhedora(gdf, geom_fazenda):
+    """Área de cada colhedora (GeoDataFrame) e a legenda com operadores e hectares.
+
+    Todas as linhas são recortadas pela fazenda preparada e engordadas de uma vez, cada
+    uma com metade da largura do seu implemento; a união sai de uma chamada só sobre
+    todos os grupos (uniao_por_grupo) e a legenda vem de um groupby. Com a coluna
+    "turno", os grupos são (turno, colhedora) e as duas saídas trazem o turno, para que
+    uma fazenda seja recortada e engordada uma única vez para todos os turnos.
+    """
+    por_turno = "turno" in gdf.columns
+    chaves = ["turno", "cd_equipamento"] if por_turno else ["cd_equipamento"]
+    vazio = gpd.GeoDataFrame(columns=chaves + ["geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    recortes = np.asarray(clipar_na_fazenda(gdf.geometry, geom_fazenda).values, dtype=object)
+    if "vl_largura_implemento" in gdf.columns:
+        larguras = pd.to_numeric(gdf["vl_largura_implemento"], errors="coerce").to_numpy(dtype="float64")
+        larguras = np.where(np.isnan(larguras) | (larguras <= 0), LARGURA_PADRAO_M, larguras)
+    else:
+        larguras = np.full(len(gdf), LARGURA_PADRAO_M)
+    agrupado = pd.DataFrame({c: gdf[c] for c in chaves}).groupby(chaves, sort=True, observed=True)
+    grupos = agrupado.ngroup().fillna(-1).to_numpy(dtype="int64")
+    validos = ~pd.isna(recortes) & (grupos >= 0)
+    validos[validos] = ~shapely.is_empty(recortes[validos])
+    if not validos.any():
+        return vazio, pd.DataFrame()
+    faixas = shapely.buffer(recortes[validos], larguras[validos] / 2.0, cap_style="flat", join_style="mitre", quad_segs=1)
+    presentes, uniao = uniao_por_grupo(faixas, grupos[validos])
+    shapely.prepare(geom_fazenda)
+    areas_geom = shapely.buffer(shapely.intersection(uniao, geom_fazenda), 0)
+    com_area = ~shapely.is_empty(areas_geom)
+    if not com_area.any():
+        return vazio, pd.DataFrame()
+    presentes, areas_geom = presentes[com_area], areas_geom[com_area]
+    indice = agrupado.size().index[presentes]
+    colhedoras = [str(c) for c in indice.get_level_values("cd_equipamento")]
+    colunas_turno = {"turno": list(indice.get_level_values("turno"))} if por_turno else {}
+    gdf_saida = gpd.GeoDataFrame({**colunas_turno, "cd_equipamento": colhedoras}, geometry=list(areas_geom), crs=f"EPSG:{CRS_METRICO}")
+
+    rotulos = rotulos_operadores(gdf)
+    com_rotulo = (rotulos != "").to_numpy() & (grupos >= 0)
+    operadores = rotulos[com_rotulo].groupby(grupos[com_rotulo]).agg(
+        lambda r: "; ".join(sorted(set(r), key=chave_ordenacao_mista))
+    )
+    df_legenda = pd.DataFrame({
+        **colunas_turno,
+        "Colhedora": colhedoras,
+        "Operadores": operadores.reindex(presentes).fillna("-").to_numpy(),
+        "Área trabalhada (ha)": np.round(shapely.area(areas_geom) / 10000, 2),
+    })
+    df_legenda = df_legenda.sort_values("Colhedora", key=lambda s: s.map(chave_ordenacao_mista), kind="stable").reset_index(drop=True)
+    return gdf_saida, df_legenda
+
+
+# =========================================================
+# DISPLAY CARTOGRÁFICO
+# =========================================================
+def adicionar_moldura_layout(fig):
+    """Aplica a moldura e o painel do mapa no mesmo padrão visual dos mapas anteriores."""
+    moldura = mpatches.FancyBboxPatch(
+        (0.01, 0.01), 0.98, 0.98,
+        boxstyle="round,pad=0.0,rounding_size=0.012",
+        transform=fig.transFigure,
+        facecolor="none",
+        edgecolor="#D8E1EB",
+        linewidth=1.0,
+        zorder=0,
+    )
+    fig.add_artist(moldura)
+    painel_mapa = mpatches.FancyBboxPatch(
+        (0.03, 0.10), 0.64, 0.78,
+        boxstyle="round,pad=0.004,rounding_size=0.015",
+        transform=fig.transFigure,
+        facecolor="#FFFFFF",
+        edgecolor="#D8E1EB",
+        linewidth=1.0,
+        zorder=0,
+    )
+    fig.add_artist(painel_mapa)
+
+
+def criar_poligonos_display(gdf_linhas, geom_fazenda):
+    """Transforma linhas operacionais em faixas, mantendo o visual antigo de Velocidade/RPM.
+
+    Todas as faixas saem de um único shapely.buffer, com a largura de cada linha, e são
+    recortadas juntas pela fazenda (clipar_na_fazenda).
+    """
+    if gdf_linhas is None or gdf_linhas.empty:
+        return gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs=f"EPSG:{CRS_METRICO}")
+    if "largura_media" in gdf_linhas.columns:
+        largura = pd.to_numeric(gdf_linhas["largura_media"], errors="coerce").to_numpy(dtype="float64")
+        largura = np.where(np.isnan(largura) | (largura <= 0), LARGURA_PADRAO_M, largura)
+    else:
+        largura = np.full(len(gdf_linhas), LARGURA_PADRAO_M)
+    faixas = shapely.buffer(np.asarray(gdf_linhas.geometry.values, dtype=object), largura / 2.0, cap_style="flat", join_style="mitre", quad_segs=1)
+    faixas = clipar_na_fazenda(gpd.GeoSeries(faixas, crs=gdf_linhas.crs), geom_fazenda)
+    manter = (faixas.notna() & ~faixas.is_empty).to_numpy()
+    if not manter.any():
+        return gpd.GeoDataFrame(columns=["geometry"], geometry="geometry", crs=gdf_linhas.crs)
+    colunas = {"geometry": faixas.values[manter]}
+    for col in ["rpm_medio", "vel_media", "duracao_seg"]:
+        colunas[col] = gdf_linhas[col].to_numpy()[manter] if col in gdf_linhas.columns else np.nan
+    colunas["largura_media"] = largura[manter]
+    return gpd.GeoDataFrame(colunas, geometry="geometry", crs=gdf_linhas.crs)
+
+# =========================================================
+# FIGURAS / PDF
+# =========================================================
+def figura_para_png_bytes(fig, dpi=PREVIA_DPI):
+    """Prévia rasterizada com o mesmo recorte do PDF, em resolução de tela."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def renderizar_mapa(figuras, previa=True):
+    """PDF de todas as figuras e prévia PNG da primeira.
+
+    `figuras` pode ser um gerador: cada página vai para o PdfPages e é fechada logo em
+    seguida, então só uma figura fica viva por vez, por mais páginas que o PDF tenha.
+    A prévia sai dos mesmos artistas da primeira página, sem redesenhar o mapa.
+    """
+    buffer = io.BytesIO()
+    png = None
+    with PdfPages(buffer) as pdf:
+        for fig in figuras:
+            try:
+                if previa and png is None:
+                    with medir_etapa("previa"):
+                        png = figura_para_png_bytes(fig)
+                with medir_etapa("pdf", paginas=1):
+                    pdf.savefig(fig, bbox_inches="tight", facecolor=fig.get_facecolor())
+            finally:
+                plt.close(fig)
+    return png, buffer.getvalue()
+
+
+def juntar_pdfs(pdfs):
+    """Concatena PDFs já renderizados (bytes) num único arquivo, sem redesenhar as páginas."""
+    escritor = PdfWriter()
+    for pdf in pdfs:
+        escritor.append(PdfReader(io.BytesIO(pdf)))
+    # Fontes e estilos repetidos entre as páginas viram um único objeto.
+    escritor.compress_identical_objects()
+    buffer = io.BytesIO()
+    escritor.write(buffer)
+    return buffer.getvalue()
+
+
+def adicionar_footer(fig, cor="#64748B"):
+    brasilia = pytz.timezone("America/Sao_Paulo")
+    hora = datetime.now(brasilia).strftime("%d/%m/%Y %H:%M")
+    fig.text(0.50, 0.030, "Relatório elaborado com base em dados da Solinftec • Resultados dependem da qualidade dos dados operacionais e geoespaciais.", ha="center", fontsize=8.8, color=cor)
+    fig.text(0.50, 0.012, f"Desenvolvido por Kauã Ceconello • Gerado em {hora}", ha="center", fontsize=8.6, color=cor)
+
+
+def adicionar_header(fig, titulo, fazenda_id, nome_fazenda, periodo_ini, periodo_fim):
+    axh = fig.add_axes([0.025, 0.905, 0.95, 0.08])
+    axh.axis("off")
+    card = mpatches.FancyBboxPatch((0, 0), 1, 1, boxstyle="round,pad=0.012,rounding_size=0.02", facecolor="#FFFFFF", edgecolor="#D8E1EB", linewidth=1.0)
+    axh.add_patch(card)
+    fonte_titulo = 14.2 if len(str(titulo)) > 58 else 14.8 if len(str(titulo)) > 48 else 16
+    axh.text(0.03, 0.64, titulo, fontsize=fonte_titulo, weight="bold", color="#0F172A", ha="left", va="center")
+    axh.text(0.03, 0.26, f"Fazenda {fazenda_id} • {nome_fazenda}", fontsize=10.2, color="#475569", ha="left", va="center")
+    axh.text(0.97, 0.26, f"Período: {periodo_ini} até {periodo_fim}", fontsize=9.2, color="#64748B", ha="right", va="center")
+
+
+def ajustar_extensao(ax, base_fazenda):
+    minx, miny, maxx, maxy = base_fazenda.total_bounds
+    dx, dy = maxx - minx, maxy - miny
+    ax.set_xlim(minx - max(dx * 0.02, 0.35), maxx + max(dx * 0.02, 0.35))
+    ax.set_ylim(miny - max(dy * 0.03, 0.70), maxy + max(dy * 0.03, 0.70))
+    ax.set_aspect("equal")
+    ax.axis("off")
+
+
+def plotar_rotulos_talhao(ax, base_fazenda):
+    if "TALHAO" not in base_fazenda.columns:
+        return
+    for _, row in base_fazenda.iterrows():
+        if row.geometry.is_empty:
+            continue
+        c = row.geometry.centroid
+        ax.text(c.x, c.y, str(row["TALHAO"]), fontsize=7.8, ha="center", va="center", color="#0F172A", weight="bold", zorder=4, bbox=dict(boxstyle="round,pad=0.14", facecolor=(1, 1, 1, 0.55), edgecolor="none"))
+
+
+def criar_cores_distintas(chaves):
+    """Cores vivas, alternadas e com alto contraste para diferenciar colhedoras."""
+    chaves = list(chaves)
+    paleta_viva = [
+        "#FF1744",  # vermelho vivo
+        "#00E676",  # verde vivo
+        "#2979FF",  # azul vivo
+        "#FFEA00",  # amarelo vivo
+        "#D500F9",  # roxo/magenta vivo
+        "#FF6D00",  # laranja vivo
+        "#00E5FF",  # ciano vivo
+        "#76FF03",  # lima vivo
+        "#F50057",  # rosa forte
+        "#651FFF",  # violeta forte
+        "#00C853",  # verde escuro vivo
+        "#FF9100",  # âmbar vivo
+        "#0091EA",  # azul forte
+        "#C6FF00",  # verde-limão
+        "#AA00FF",  # púrpura vivo
+        "#FF3D00",  # vermelho alaranjado
+        "#1DE9B6",  # turquesa vivo
+        "#FFD600",  # dourado vivo
+        "#304FFE",  # índigo vivo
+        "#64DD17",  # verde claro vivo
+    ]
+    cores = {}
+    for i, chave in enumerate(chaves):
+        if i < len(paleta_viva):
+            cores[chave] = paleta_viva[i]
+        else:
+            cores[chave] = to_hex(plt.cm.hsv((i * 0.61803398875) % 1.0))
+    return cores
+
+
+def criar_figura_area(base_fazenda, area_trabalhada, area_total_ha, area_trab_ha, area_nao_ha, pct_trab, pct_nao, periodo_ini, periodo_fim, fazenda_id, nome_fazenda):
+    fig = plt.figure(figsize=(15.5, 8.8))
+    fig.patch.set_facecolor("#F4F7FB")
+    adicionar_moldura_layout(fig)
+    adicionar_header(fig, "Mapa de Área Trabalhada", fazenda_id, nome_fazenda, periodo_ini, periodo_fim)
+    ax = fig.add_axes([0.06, 0.16, 0.58, 0.66])
+    base_fazenda.plot(ax=ax, facecolor="#E5E7EB", edgecolor="#334155", linewidth=1.0, zorder=1)
+    if area_trabalhada is not None and not area_trabalhada.is_empty:
+        gpd.GeoSeries([area_trabalhada], crs=base_fazenda.crs).plot(ax=ax, color="#22C55E", alpha=0.88, zorder=2)
+    base_fazenda.boundary.plot(ax=ax, color="#0F172A", linewidth=1.1, zorder=3)
+    plotar_rotulos_talhao(ax, base_fazenda)
+    ajustar_extensao(ax, base_fazenda)
+
+    axr = fig.add_axes([0.71, 0.23, 0.25, 0.48])
+    axr.set_xlim(0, 1)
+    axr.set_ylim(0, 1)
+    axr.axis("off")
+    box = mpatches.FancyBboxPatch((0, 0), 1, 1, boxstyle="round,pad=0.018,rounding_size=0.03", facecolor="#FFFFFF", edgecolor="#D8E1EB", linewidth=1.0)
+    axr.add_patch(box)
+    axr.text(0.08, 0.92, "Resumo da Operação", fontsize=12, weight="bold", color="#0F172A")
+    axr.text(0.08, 0.77, "Área total", fontsize=8.7, color="#64748B")
+    axr.text(0.92, 0.77, f"{area_total_ha} ha", fontsize=10.2, color="#0F172A", ha="right", weight="bold")
+    axr.text(0.08, 0.62, "Trabalhada", fontsize=8.7, color="#64748B")
+    axr.text(0.92, 0.62, f"{area_trab_ha} ha ({pct_trab}%)", fontsize=10.0, color="#16A34A", ha="right", weight="bold")
+    axr.text(0.08, 0.47, "Não trabalhada", fontsize=8.7, color="#64748B")
+    axr.text(0.92, 0.47, f"{area_nao_ha} ha ({pct_nao}%)", fontsize=10.0, color="#475569", ha="right", weight="bold")
+    axr.add_patch(mpatches.FancyBboxPatch((0.08, 0.28), 0.84, 0.06, boxstyle="round,pad=0.004,rounding_size=0.015", facecolor="#E5E7EB", edgecolor="none"))
+    axr.add_patch(mpatches.FancyBboxPatch((0.08, 0.28), 0.84 * min(max(pct_trab / 100, 0), 1), 0.06, boxstyle="round,pad=0.004,rounding_size=0.015", facecolor="#22C55E", edgecolor="none"))
+    axr.text(0.50, 0.20, f"Cobertura operacional: {pct_trab}%", fontsize=9.6, color="#0F172A", ha="center", weight="bold")
+    adicionar_footer(fig)
+    return fig
+
+
+def criar_figura_area_colhedora(base_fazenda, gdf_area_colhedora, df_legenda, cores, turno, periodo_txt, fazenda_id, nome_fazenda, frente_nome=None):
+    fig = plt.figure(figsize=(15.5, 8.8))
+    fig.patch.set_facecolor("#F4F7FB")
+    adicionar_moldura_layout(fig)
+    prefixo_frente = f"{frente_nome} • " if frente_nome else ""
+    titulo = f"Mapa de Área por Colhedora/Operador • {prefixo_frente}{turno} ({intervalo_turno(turno)})"
+    adicionar_header(fig, titulo, fazenda_id, nome_fazenda, periodo_txt, periodo_txt)
+
+    ax = fig.add_axes([0.06, 0.16, 0.58, 0.66])
+    base_fazenda.plot(ax=ax, facecolor="#FFFFFF", edgecolor="#334155", linewidth=1.0, zorder=1)
+    if gdf_area_colhedora is not None and not gdf_area_colhedora.empty:
+        for colhedora, cor in cores.items():
+            sub = gdf_area_colhedora[gdf_area_colhedora["cd_equipamento"] == colhedora]
+            if not sub.empty:
+                sub.plot(ax=ax, color=cor, edgecolor="none", alpha=0.92, zorder=2)
+    base_fazenda.boundary.plot(ax=ax, color="#0F172A", linewidth=1.1, zorder=3)
+    plotar_rotulos_talhao(ax, base_fazenda)
+    ajustar_extensao(ax, base_fazenda)
+
+    axl = fig.add_axes([0.71, 0.16, 0.25, 0.68])
+    axl.axis("off")
+    axl.set_xlim(0, 1)
+    axl.set_ylim(0, 1)
+    box = mpatches.FancyBboxPatch((0, 0), 1, 1, boxstyle="round,pad=0.018,rounding_size=0.03", facecolor="#FFFFFF", edgecolor="#D8E1EB", linewidth=1.0)
+    axl.add_patch(box)
+    axl.text(0.07, 0.955, "Resumo por Colhedora", fontsize=12, weight="bold", color="#0F172A", va="center")
+    subtitulo = f"{frente_nome} • {turno} • {intervalo_turno(turno)}" if frente_nome else f"{turno} • {intervalo_turno(turno)}"
+    axl.text(0.07, 0.915, subtitulo, fontsize=8.2, color="#64748B", va="center")
+    axl.plot([0.07, 0.93], [0.885, 0.885], color="#E2E8F0", linewidth=1)
+
+    if df_legenda is None or df_legenda.empty:
+        axl.text(0.50, 0.50, "Sem dados válidos.", fontsize=9, color="#64748B", ha="center")
+    else:
+        linhas_legenda = []
+        for _, row in df_legenda.iterrows():
+            colhedora = str(row["Colhedora"])
+            area_txt = formatar_area_ha(row["Área trabalhada (ha)"])
+            cor = cores.get(colhedora, "#CCCCCC")
+            operadores = [op.strip() for op in str(row["Operadores"]).split(";") if op.strip()] or ["-"]
+            linhas_legenda.append({"tipo": "colhedora", "texto": f"{colhedora}: {area_txt}", "cor": cor})
+            for operador in operadores:
+                linhas_legenda.append({"tipo": "operador", "texto": operador, "cor": cor})
+
+        total_linhas = len(linhas_legenda)
+        topo_texto, base_texto = 0.850, 0.075
+        altura_disponivel = topo_texto - base_texto
+        espacamento = 0.050 if total_linhas <= 1 else min(0.052, altura_disponivel / max(total_linhas - 1, 1))
+        altura_usada = espacamento * max(total_linhas - 1, 0)
+        y_inicio = min(topo_texto, base_texto + altura_disponivel / 2 + altura_usada / 2)
+        fonte_operador = max(4.4, min(9.2, espacamento * 210))
+        fonte_colhedora = max(5.0, min(10.4, fonte_operador + 1.1))
+        tamanho_quadrado = max(0.017, min(0.040, espacamento * 1.20))
+        limite_operador = 44 if fonte_operador >= 8 else 39 if fonte_operador >= 6.5 else 34 if fonte_operador >= 5.2 else 30
+
+        for i, item in enumerate(linhas_legenda):
+            y = y_inicio - i * espacamento
+            if item["tipo"] == "colhedora":
+                axl.add_patch(mpatches.FancyBboxPatch((0.07, y - tamanho_quadrado / 2), tamanho_quadrado, tamanho_quadrado, boxstyle="round,pad=0.002,rounding_size=0.004", facecolor=item["cor"], edgecolor="none"))
+                txt = item["texto"]
+                if len(txt) > 32 and fonte_colhedora < 6:
+                    txt = txt[:29] + "..."
+                axl.text(0.125, y, txt, fontsize=fonte_colhedora, color="#0F172A", weight="bold", ha="left", va="center")
+            else:
+                operador_txt = item["texto"] if len(item["texto"]) <= limite_operador else item["texto"][:limite_operador - 3] + "..."
+                axl.text(0.125, y, f"• {operador_txt}", fontsize=fonte_operador, color="#475569", ha="left", va="center")
+
+    adicionar_footer(fig)
+    return fig
+
+def criar_figura_tematica(base_fazenda, gdf_linhas, coluna_classe, mapa_cores, df_legenda, titulo, titulo_legenda, faixa_txt, media_txt, periodo_ini, periodo_fim, fazenda_id, nome_fazenda):
+    fig = plt.figure(figsize=(15.5, 8.8))
+    fig.patch.set_facecolor("#F4F7FB")
+    adicionar_moldura_layout(fig)
+    adicionar_header(fig, titulo, fazenda_id, nome_fazenda, periodo_ini, periodo_fim)
+
+    ax = fig.add_axes([0.06, 0.16, 0.58, 0.66])
+    base_fazenda.plot(ax=ax, facecolor="#FFFFFF", edgecolor="#334155", linewidth=1.0, zorder=1)
+    if gdf_linhas is not None and not gdf_linhas.empty and coluna_classe in gdf_linhas.columns:
+        for classe, cor in mapa_cores.items():
+            sub = gdf_linhas[gdf_linhas[coluna_classe] == classe]
+            if not sub.empty:
+                sub.plot(ax=ax, color=cor, edgecolor="none", alpha=0.95, zorder=2)
+    base_fazenda.boundary.plot(ax=ax, color="#0F172A", linewidth=1.1, zorder=3)
+    plotar_rotulos_talhao(ax, base_fazenda)
+    ajustar_extensao(ax, base_fazenda)
+
+    axb = fig.add_axes([0.71, 0.16, 0.25, 0.68])
+    axb.set_xlim(0, 1)
+    axb.set_ylim(0, 1)
+    axb.axis("off")
+    box = mpatches.FancyBboxPatch((0, 0), 1, 1, boxstyle="round,pad=0.018,rounding_size=0.03", facecolor="#FFFFFF", edgecolor="#D8E1EB", linewidth=1.0)
+    axb.add_patch(box)
+    axb.text(0.07, 0.945, titulo_legenda, fontsize=12, weight="bold", color="#0F172A", ha="left", va="center")
+    axb.text(0.07, 0.895, f"Faixa exibida: {faixa_txt}", fontsize=8.8, color="#64748B", ha="left", va="center")
+    chip = mpatches.FancyBboxPatch((0.07, 0.805), 0.86, 0.072, boxstyle="round,pad=0.01,rounding_size=0.02", facecolor="#EFF6FF", edgecolor="#BFDBFE", linewidth=0.8)
+    axb.add_patch(chip)
+    axb.text(0.50, 0.841, media_txt, fontsize=10.0, color="#1D4ED8", weight="bold", ha="center", va="center")
+    axb.plot([0.07, 0.93], [0.755, 0.755], color="#E2E8F0", linewidth=1)
+
+    if not df_legenda.empty:
+        topo, base_y = 0.695, 0.08
+        row_h = (topo - base_y) / max(len(df_legenda), 1)
+        for i, row in df_legenda.reset_index(drop=True).iterrows():
+            y = topo - i * row_h
+            pct_txt = f"{row['percentual']:.1f}%".replace(".", ",")
+            axb.add_patch(mpatches.FancyBboxPatch((0.07, y - 0.020), 0.025, 0.025, boxstyle="round,pad=0.002,rounding_size=0.004", facecolor=row["cor"], edgecolor="none"))
+            axb.text(0.11, y - 0.007, row["faixa"], fontsize=8.9, color="#0F172A", ha="left", va="center")
+            axb.text(0.88, y - 0.007, pct_txt, fontsize=8.9, color="#334155", ha="center", va="center", weight="bold")
+    else:
+        axb.text(0.50, 0.55, "Sem dados válidos para exibir.", fontsize=9.2, color="#64748B", ha="center")
+
+    adicionar_footer(fig)
+    return fig
+
+
+
+def criar_figura_separador_turno_pdf(nome_frente, turno):
+    """Página separadora para o PDF por frente, evitando confusão entre turnos."""
+    fig = plt.figure(figsize=(15.5, 8.8))
+    fig.patch.set_facecolor("#F4F7FB")
+    moldura = mpatches.FancyBboxPatch((0.01, 0.01), 0.98, 0.98, boxstyle="round,pad=0.0,rounding_size=0.012", transform=fig.transFigure, facecolor="none", edgecolor="#D8E1EB", linewidth=1.0, zorder=0)
+    fig.add_artist(moldura)
+    ax = fig.add_axes([0.10, 0.18, 0.80, 0.64])
+    ax.axis("off")
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    card = mpatches.FancyBboxPatch((0, 0), 1, 1, boxstyle="round,pad=0.025,rounding_size=0.04", facecolor="#FFFFFF", edgecolor="#D8E1EB", linewidth=1.2)
+    ax.add_patch(card)
+    ax.text(0.50, 0.68, nome_frente, fontsize=30, weight="bold", color="#0F172A", ha="center", va="center")
+    ax.text(0.50, 0.50, turno, fontsize=42, weight="bold", color="#2563EB", ha="center", va="center")
+    ax.text(0.50, 0.35, intervalo_turno(turno), fontsize=17, color="#64748B", ha="center", va="center")
+    ax.plot([0.18, 0.82], [0.26, 0.26], color="#E2E8F0", linewidth=1.2)
+    ax.text(0.50, 0.18, "As próximas páginas correspondem às fazendas trabalhadas neste turno.", fontsize=11, color="#475569", ha="center", va="center")
+    adicionar_footer(fig)
+    return fig
+
+def criar_figura_tabela_talhoes_pdf(df_talhoes, fazenda_id, nome_fazenda, pagina_atual=1, total_paginas=1, area_total_trabalhada=None, area_total_fazenda=None):
+    df_base = ordenar_tabela_talhoes(df_talhoes)
+    df_dados = df_base[df_base["Gleba"].astype(str).str.upper() != "TOTAL"].copy()
+    for col in ["Área total (ha)", "Área trabalhada (ha)"]:
+        if col in df_dados.columns:
+            df_dados[col] = pd.to_numeric(df_dados[col], errors="coerce").fillna(0).round(2)
+    if area_total_trabalhada is None:
+        area_total_trabalhada = pd.to_numeric(df_dados.get("Área trabalhada (ha)", pd.Series(dtype=float)), errors="coerce").fillna(0).sum()
+    if area_total_fazenda is None:
+        area_total_fazenda = pd.to_numeric(df_dados.get("Área total (ha)", pd.Series(dtype=float)), errors="coerce").fillna(0).sum()
+
+    fig = plt.figure(figsize=(11.69, 8.27))
+    fig.patch.set_facecolor("#F4F7FB")
+    axh = fig.add_axes([0.035, 0.895, 0.93, 0.08])
+    axh.axis("off")
+    axh.text(0.025, 0.62, "Área Trabalhada por Gleba / Talhão", fontsize=15.5, weight="bold", color="#0F172A")
+    axh.text(0.025, 0.28, f"Fazenda {fazenda_id} • {nome_fazenda}", fontsize=9.8, color="#64748B")
+    axh.text(0.975, 0.50, f"Página {pagina_atual} de {total_paginas}", fontsize=9.2, color="#64748B", ha="right")
+
+    ax = fig.add_axes([0.065, 0.12, 0.87, 0.70])
+    ax.axis("off")
+    if df_dados.empty:
+        ax.text(0.5, 0.5, "Sem dados de área por talhão.", ha="center", va="center", fontsize=11, color="#64748B")
+        adicionar_footer(fig)
+        return fig
+
+    df_tab = df_dados[["Gleba", "Talhão", "Área total (ha)", "Área trabalhada (ha)"]].copy()
+    df_tab["% Trabalhado"] = np.where(df_tab["Área total (ha)"] > 0, (df_tab["Área trabalhada (ha)"] / df_tab["Área total (ha)"] * 100).round(1), 0)
+    df_tab["Área total (ha)"] = df_tab["Área total (ha)"].apply(formatar_area_ha)
+    df_tab["Área trabalhada (ha)"] = df_tab["Área trabalhada (ha)"].apply(formatar_area_ha)
+    df_tab["% Trabalhado"] = df_tab["% Trabalhado"].apply(lambda x: f"{x:.1f}%".replace(".", ","))
+    tabela = ax.table(cellText=df_tab.values, colLabels=df_tab.columns, loc="center", cellLoc="center", colLoc="center")
+    tabela.auto_set_font_size(False)
+    tabela.set_fontsize(8.5)
+    tabela.scale(1, 1.35)
+    adicionar_footer(fig)
+    return fig
+
+
+def criar_figuras_tabela_talhoes_pdf(df_talhoes, fazenda_id, nome_fazenda, linhas_por_pagina=12):
+    if df_talhoes is None or df_talhoes.empty:
+        return
+    df_ordenado = ordenar_tabela_talhoes(df_talhoes)
+    df_total = df_ordenado[df_ordenado["Gleba"].astype(str).str.upper() == "TOTAL"].copy()
+    df_dados = df_ordenado[df_ordenado["Gleba"].astype(str).str.upper() != "TOTAL"].copy()
+    if not df_total.empty:
+        area_total_trabalhada = pd.to_numeric(df_total["Área trabalhada (ha)"].iloc[0], errors="coerce")
+        area_total_fazenda = pd.to_numeric(df_total["Área total (ha)"].iloc[0], errors="coerce")
+    else:
+        area_total_trabalhada = pd.to_numeric(df_dados["Área trabalhada (ha)"], errors="coerce").fillna(0).sum()
+        area_total_fazenda = pd.to_numeric(df_dados["Área total (ha)"], errors="coerce").fillna(0).sum()
+    paginas_df = [df_dados.iloc[i:i + linhas_por_pagina].copy() for i in range(0, len(df_dados), linhas_por_pagina)] or [df_dados.copy()]
+    # Gerador: cada página só é montada quando a anterior já foi gravada e fechada.
+    for idx, df_pag in enumerate(paginas_df, start=1):
+        with medir_etapa("figura"):
+            fig = criar_figura_tabela_talhoes_pdf(df_pag, fazenda_id, nome_fazenda, idx, len(paginas_df), area_total_trabalhada, area_total_fazenda)
+        yield fig
+
+# =========================================================
+# PROCESSAMENTO POR FAZENDA
+# =========================================================
+# Cada fazenda é independente: os workers abaixo recebem só dados serializáveis
+# (recorte do CSV, dados da fazenda na base e parâmetros) e devolvem bytes e números,
+# para rodarem em processos separados e voltarem prontos para a interface.
+def contexto_processos():
+    metodos = multiprocessing.get_all_start_methods()
+    if "forkserver" not in metodos:
+        return multiprocessing.get_context("spawn")
+    contexto = multiprocessing.get_context("forkserver")
+    contexto.set_forkserver_preload([__name__])
+    return contexto
+
+
+def executar_medindo(funcao, tarefa):
+    """Roda uma tarefa (FAZENDA_ID, dados da base, recorte do df, ...) medindo suas etapas.
+
+    Devolve (resultado, registros) para que as medições feitas num processo do pool
+    voltem ao processo principal, cada uma marcada com a fazenda.
+    """
+    contagens = {"linhas": len(tarefa[2])} if len(tarefa) > 2 and isinstance(tarefa[2], pd.DataFrame) else {}
+    with coletar_etapas() as registros:
+        with medir_etapa("fazenda", **contagens):
+            resultado = funcao(*tarefa)
+    for registro in registros:
+        registro["fazenda"] = tarefa[0]
+    return resultado, registros
+
+
+def chave_mapa(funcao, tarefa):
+    """Hash de uma tarefa: worker, fazenda, geometrias da base, recorte do CSV e parâmetros."""
+    fazenda_id, dados_fazenda, df_tarefa, *demais = tarefa
+    sha = hashlib.sha1(f"{funcao.__name__}|{fazenda_id}|{dados_fazenda['nome']}".encode("utf-8"))
+    sha.update(shapely.to_wkb(dados_fazenda["geom"]))
+    sha.update(dados_fazenda.get("area_bruta") or b"")
+    for geom in shapely.to_wkb(np.asarray(dados_fazenda["base"].geometry.values, dtype=object)):
+        sha.update(geom)
+    sha.update("|".join(map(str, df_tarefa.columns)).encode("utf-8"))
+    sha.update(pd.util.hash_pandas_object(df_tarefa, index=False).to_numpy().tobytes())
+    sha.update(json.dumps(demais, sort_keys=True, default=str).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def executar_em_paralelo(funcao, tarefas, num_processos=None, cache=None):
+    """Aplica funcao(*tarefa) a cada tarefa e entrega os resultados na ordem das tarefas.
+
+    Com um processo (ou uma tarefa só) roda no próprio processo, sem o custo do pool.
+    Se houver coleta de etapas ativa, as medições de cada fazenda entram nela. Com um
+    `cache` (OrderedDict de quem chama; no app, o da sessão), fazendas já processadas
+    com os mesmos dados e parâmetros são reaproveitadas (um rerun do Streamlit não
+    redesenha os mapas).
+    """
+    tarefas = list(tarefas)
+    registros = _REGISTROS_ETAPAS.get()
+    chaves, prontos = [None] * len(tarefas), {}
+    if cache is not None:
+        with medir_etapa("cache_mapas", tarefas=len(tarefas)) as medida:
+            chaves = [chave_mapa(funcao, tarefa) for tarefa in tarefas]
+            for i, chave in enumerate(chaves):
+                if chave in cache:
+                    cache.move_to_end(chave)
+                    prontos[i] = cache[chave]
+            medida["acertos"] = len(prontos)
+    pendentes = [i for i in range(len(tarefas)) if i not in prontos]
+
+    def receber(i, saida):
+        if registros is not None:
+            saida, registros_tarefa = saida
+            registros.extend(registros_tarefa)
+        if chaves[i] is not None:
+            guardar_lru(cache, chaves[i], saida, MAX_MAPAS_EM_CACHE)
+        return saida
+
+    num_processos = min(num_processos or NUM_PROCESSOS, len(pendentes))
+    if num_processos <= 1:
+        for i, tarefa in enumerate(tarefas):
+            if i in prontos:
+                yield prontos[i]
+            elif registros is None:
+                yield receber(i, funcao(*tarefa))
+            else:
+                yield receber(i, executar_medindo(funcao, tarefa))
+        return
+    executor = ProcessPoolExecutor(max_workers=num_processos, mp_context=contexto_processos())
+    try:
+        if registros is None:
+            futuros = {i: executor.submit(funcao, *tarefas[i]) for i in pendentes}
+        else:
+            futuros = {i: executor.submit(executar_medindo, funcao, tarefas[i]) for i in pendentes}
+        for i in range(len(tarefas)):
+            yield prontos[i] if i in prontos else receber(i, futuros[i].result())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def filtrar_geometrias(df, coluna, tipo):
+    """Linhas cuja coluna de geometria traz o tipo WKT pedido ("POLYGON", "LINESTRING")."""
+    if coluna_e_geometria(df[coluna]):
+        return df[gpd.GeoSeries(df[coluna]).geom_type.str.upper().str.contains(tipo, na=False)].copy()
+    mascara = df[coluna].notna() & df[coluna].astype(str).str.upper().str.contains(tipo, na=False)
+    return df[mascara].copy()
+
+
+def filtrar_pontos_operacao(df):
+    """Pontos em operação (estado E, sem parada) com horário e coordenadas."""
+    df_oper = df[(df["cd_estado"] == "E") & (pd.to_numeric(df["cd_operacao_parada"], errors="coerce") == -1)]
+    return df_oper.dropna(subset=["dt_hr_local_inicial", "vl_latitude_inicial", "vl_longitude_inicial"]).copy()
+
+
+def tarefas_por_fazenda(df, fazendas_base, *args):
+    """Uma tarefa (FAZENDA_ID, dados da base, recorte do df, *args) por fazenda presente na base."""
+    recortes = dict(iter(df.groupby("cd_fazenda", observed=True, sort=False)))
+    fazendas = sorted((f for f in recortes if f in fazendas_base), key=chave_ordenacao_mista)
+    return [(fazenda_id, fazendas_base[fazenda_id], recortes[fazenda_id], *args) for fazenda_id in fazendas]
+
+
+def tarefas_operador(df_linhas, coluna_linha, frente_fazendas, fazendas_base, *args):
+    """Tarefas do modo colhedora: uma por fazenda de cada frente, com as linhas de todos os turnos.
+
+    Cada tarefa é (FAZENDA_ID, dados da base, recorte, coluna_linha, frente, *args) e
+    devolve uma lista de resultados por turno; juntar_resultados_operador os põe na
+    ordem do PDF de cada frente.
+    """
+    tarefas = []
+    for nome_frente in FRENTES:
+        fazendas_frente = frente_fazendas.get(nome_frente, [])
+        if not fazendas_frente:
+            continue
+        df_frente = df_linhas[df_linhas["cd_fazenda"].isin(fazendas_frente)]
+        tarefas.extend(tarefas_por_fazenda(df_frente, fazendas_base, coluna_linha, nome_frente, *args))
+    return tarefas
+
+
+def juntar_resultados_operador(saidas):
+    """Resultados das tarefas de tarefas_operador numa lista só, na ordem frente > turno > fazenda."""
+    registros = [r for resultados in saidas for r in resultados]
+    return sorted(registros, key=lambda r: (FRENTES.index(r["frente"]), ORDEM_TURNOS.index(r["turno"])))
+
+
+def area_trabalhada_por_talhao(talhoes, area_trabalhada):
+    """Área trabalhada (m²) dentro de cada talhão, sem montar geometrias novas de recorte.
+
+    Uma STRtree sobre os talhões cruza os envelopes com as partes da área trabalhada: o
+    talhão sem nenhum cruzamento fica com zero e o que a área (preparada) contém por
+    inteiro fica com a própria área. Dos outros, os que a área preparada nem toca (só o
+    envelope cruzava) também ficam com zero. Só os talhões da borda calculam a interseção,
+    e só contra as partes que tocam o envelope deles; as partes são disjuntas, então as
+    áreas de cada par somam a do talhão.
+    """
+    talhoes = np.asarray(talhoes, dtype=object)
+    areas = np.zeros(len(talhoes))
+    if area_trabalhada is None or area_trabalhada.is_empty or not len(talhoes):
+        return areas
+    partes = shapely.get_parts(area_trabalhada)
+    indices_partes, indices_talhoes = shapely.STRtree(talhoes).query(partes)
+    candidatos = np.unique(indices_talhoes)
+    shapely.prepare(area_trabalhada)
+    dentro = shapely.contains(area_trabalhada, talhoes[candidatos])
+    areas[candidatos[dentro]] = shapely.area(talhoes[candidatos[dentro]])
+    restantes = candidatos[~dentro]
+    restantes = restantes[shapely.intersects(area_trabalhada, talhoes[restantes])]
+    borda = np.isin(indices_talhoes, restantes)
+    if borda.any():
+        intersecoes = shapely.intersection(talhoes[indices_talhoes[borda]], partes[indices_partes[borda]])
+        areas += np.bincount(indices_talhoes[borda], weights=shapely.area(intersecoes), minlength=len(talhoes))
+    return areas
+
+
+def calcular_tabela_talhoes(base_fazenda, area_trabalhada):
+    total = base_fazenda[["GLEBA", "TALHAO"]].copy()
+    total["Área total (ha)"] = base_fazenda.geometry.area / 10000
+    trabalhada = total[["GLEBA", "TALHAO"]].assign(**{"Área trabalhada (ha)": area_trabalhada_por_talhao(base_fazenda.geometry.values, area_trabalhada) / 10000})
+    trab = trabalhada[trabalhada["Área trabalhada (ha)"] > 0].groupby(["GLEBA", "TALHAO"])["Área trabalhada (ha)"].sum().reset_index()
+    df_talhoes = total.merge(trab, on=["GLEBA", "TALHAO"], how="left")
+    df_talhoes["Área trabalhada (ha)"] = df_talhoes["Área trabalhada (ha)"].fillna(0)
+    df_talhoes = df_talhoes.rename(columns={"GLEBA": "Gleba", "TALHAO": "Talhão"})
+    df_talhoes = df_talhoes[["Gleba", "Talhão", "Área total (ha)", "Área trabalhada (ha)"]]
+    df_talhoes["Área total (ha)"] = pd.to_numeric(df_talhoes["Área total (ha)"], errors="coerce").fillna(0).round(2)
+    df_talhoes["Área trabalhada (ha)"] = pd.to_numeric(df_talhoes["Área trabalhada (ha)"], errors="coerce").fillna(0).round(2)
+    total_row = pd.DataFrame({
+        "Gleba": ["TOTAL"],
+        "Talhão": [""],
+        "Área total (ha)": [round(df_talhoes["Área total (ha)"].sum(), 2)],
+        "Área trabalhada (ha)": [round(df_talhoes["Área trabalhada (ha)"].sum(), 2)],
+    })
+    return ordenar_tabela_talhoes(pd.concat([df_talhoes, total_row], ignore_index=True))
+
+
+def passadas_metricas(df_area, coluna_poligono):
+    """Polígonos das passadas no CRS métrico, como array do shapely; None quando não há nenhum."""
+    with medir_etapa("geometria", linhas=len(df_area)) as medida:
+        gdf_area = criar_gdf_wkt(df_area, coluna_poligono, crs="EPSG:4326")
+        medida["geometrias"] = len(gdf_area)
+        medida["wkt_invalidos"] = gdf_area.attrs.get("wkt_invalidos", 0)
+        if gdf_area.empty:
+            return None
+        return np.asarray(gdf_area.to_crs(epsg=CRS_METRICO).geometry.values, dtype=object)
+
+
+def uniao_passadas(df_area, coluna_poligono, anterior=None):
+    """União das passadas (polígonos WKT) no CRS métrico, somada à geometria `anterior`.
+
+    None quando não há nenhuma geometria.
+    """
+    geoms = passadas_metricas(df_area, coluna_poligono)
+    if geoms is None:
+        return anterior
+    with medir_etapa("buffer_uniao", linhas=len(geoms)):
+        return fechar_area_trabalhada(geoms if anterior is None else np.append(geoms, anterior), 0, 0)
+
+
+def fechar_area_trabalhada(passadas, dist, recuo, tolerancia_m=0.0, bloco_m=BLOCO_AREA_M):
+    """União das passadas com as falhas fechadas: buffer `dist` para fora, `recuo` para dentro e buffer(0).
+
+    O buffer para fora é feito em lote em cada passada antes da união (a união das
+    passadas já engordadas é a mesma área e sai mais barata, porque as falhas fecham
+    antes). Extensões maiores que um bloco são então unidas bloco a bloco: cada bloco
+    junta só as passadas que o tocam (consulta numa STRtree), recortadas com uma margem
+    que cobre o alcance do recuo (os cantos em mitra dele); o recuo
+    roda em lote sobre todos os blocos, cada resultado é recortado de volta ao seu bloco
+    e os blocos são unidos no fim. Nenhuma união ou buffer percorre a fazenda inteira de
+    uma vez. `tolerancia_m` > 0 simplifica os vértices de cada passada antes de tudo.
+
+    Sobre o cálculo antigo (união de todas as passadas e os três buffers na geometria
+    inteira), a área fica dentro de 0,002% sem simplificação; com 0,5 m de tolerância e
+    o buffer mínimo padrão, dentro de 0,1%.
+    """
+    passadas = np.atleast_1d(np.asarray(passadas, dtype=object))
+    if tolerancia_m > 0:
+        passadas = shapely.simplify(passadas, tolerancia_m)
+    if dist > 0:
+        passadas = shapely.buffer(passadas, dist, join_style="mitre")
+    # O buffer para fora já está nas passadas, então a extensão delas basta; a margem só
+    # cobre o recuo, que num canto em mitra alcança até LIMITE_MITRE vezes a distância.
+    margem = recuo * LIMITE_MITRE
+    xmin, ymin, xmax, ymax = shapely.total_bounds(passadas) + [-margem, -margem, margem, margem]
+    nx, ny = int(np.ceil((xmax - xmin) / bloco_m)) or 1, int(np.ceil((ymax - ymin) / bloco_m)) or 1
+    if nx * ny == 1:
+        area_bruta = shapely.union_all(passadas)
+        return area_bruta.buffer(-recuo, join_style=2).buffer(0) if recuo > 0 else area_bruta.buffer(0)
+    x0, y0 = np.meshgrid(xmin + np.arange(nx) * bloco_m, ymin + np.arange(ny) * bloco_m)
+    x0, y0 = x0.ravel(), y0.ravel()
+    ampliados = shapely.box(x0 - margem, y0 - margem, x0 + bloco_m + margem, y0 + bloco_m + margem)
+    indices_blocos, indices_passadas = shapely.STRtree(passadas).query(ampliados)
+    ocupados = np.unique(indices_blocos)
+    partes = np.empty(len(ocupados), dtype=object)
+    for i, bloco in enumerate(ocupados):
+        selecionadas = indices_passadas[indices_blocos == bloco]
+        partes[i] = shapely.union_all(shapely.intersection(passadas[selecionadas], ampliados[bloco]))
+    if recuo > 0:
+        partes = shapely.buffer(partes, -recuo, join_style="mitre")
+    x0, y0 = x0[ocupados], y0[ocupados]
+    partes = shapely.intersection(shapely.buffer(partes, 0), shapely.box(x0, y0, x0 + bloco_m, y0 + bloco_m))
+    return shapely.union_all(partes[~shapely.is_empty(partes)])
+
+
+def preparar_fazenda_area(fazenda_id, dados_fazenda, df_faz_area, coluna_poligono, parametros):
+    """Área trabalhada e números de uma fazenda, sem desenhar o mapa; None quando não há área suficiente.
+
+    O que a figura precisa fica em "desenho", para renderizar_fazenda montar o mapa depois.
+    No modo incremental, dados_fazenda["area_bruta"] já traz a união das passadas (WKB)
+    guardada no armazém e o WKT não é lido de novo.
+    """
+    base_fazenda, geom_fazenda, nome_fazenda = dados_fazenda["base"], dados_fazenda["geom"], dados_fazenda["nome"]
+    periodo_ini, periodo_fim = obter_periodo(df_faz_area, None)
+    if dados_fazenda.get("area_bruta") is not None:
+        passadas = [shapely.from_wkb(dados_fazenda["area_bruta"])]
+    else:
+        passadas = passadas_metricas(df_faz_area, coluna_poligono)
+    if passadas is None:
+        return None
+    with medir_etapa("buffer_uniao", geometrias=len(passadas)):
+        largura_media = calcular_largura_media(df_faz_area)
+        buffer_minimo = parametros["BUFFER_MINIMO_M"]
+        if pd.notna(largura_media) and largura_media > 0 and parametros["MULTIPLICADOR_BUFFER_AREA"] > 0:
+            dist = max(largura_media * parametros["MULTIPLICADOR_BUFFER_AREA"], buffer_minimo)
+        else:
+            dist = buffer_minimo
+        area_trabalhada = fechar_area_trabalhada(passadas, dist, dist * parametros["FATOR_RECUO_GAPS"], parametros["SIMPLIFICAR_AREA_M"])
+        if parametros["AREA_MAX_BURACO_HA"] > 0:
+            area_trabalhada = preencher_buracos_pequenos(area_trabalhada, parametros["AREA_MAX_BURACO_HA"] * 10000)
+    with medir_etapa("recorte"):
+        area_trabalhada = area_trabalhada.intersection(geom_fazenda).buffer(0)
+    if area_trabalhada.is_empty:
+        return None
+    area_total_ha = round(dados_fazenda["area_ha"], 2)
+    area_trab_ha = round(area_trabalhada.area / 10000, 2)
+    if area_trab_ha < parametros["AREA_MIN_HA"]:
+        return None
+    area_nao_ha = round(max(area_total_ha - area_trab_ha, 0), 2)
+    pct_trab = round(area_trab_ha / area_total_ha * 100, 1) if area_total_ha > 0 else 0
+    pct_nao = round(100 - pct_trab, 1)
+
+    df_talhoes = None
+    if parametros["MOSTRAR_TALHOES"] and "TALHAO" in base_fazenda.columns and "GLEBA" in base_fazenda.columns:
+        with medir_etapa("tabela_talhoes", geometrias=len(base_fazenda)):
+            df_talhoes = calcular_tabela_talhoes(base_fazenda, area_trabalhada)
+    return {
+        "tipo": "area",
+        "fazenda_id": fazenda_id,
+        "nome_fazenda": nome_fazenda,
+        "png": None,
+        "pdf": None,
+        "df_talhoes": df_talhoes,
+        "area_total_ha": area_total_ha,
+        "area_trab_ha": area_trab_ha,
+        "pct_trab": pct_trab,
+        "desenho": {
+            "base_fazenda": base_fazenda,
+            "area_trabalhada": area_trabalhada,
+            "area_nao_ha": area_nao_ha,
+            "pct_nao": pct_nao,
+            "periodo": (periodo_ini, periodo_fim),
+        },
+    }
+
+
+def preparar_fazenda_operador(fazenda_id, dados_fazenda, df_faz, coluna_linha, nome_frente, parametros):
+    """Área por colhedora de uma fazenda em cada turno, sem desenhar os mapas.
+
+    As linhas de todos os turnos são lidas, recortadas e engordadas uma vez só; devolve um
+    resultado por turno (na ordem de ORDEM_TURNOS), sem os turnos abaixo da área mínima.
+    """
+    base_fazenda, geom_fazenda, nome_fazenda = dados_fazenda["base"], dados_fazenda["geom"], dados_fazenda["nome"]
+    gdf_area_colhedora, df_legenda = criar_area_colhedora_por_linhas(df_faz, coluna_linha, geom_fazenda)
+    if gdf_area_colhedora.empty or df_legenda.empty:
+        return []
+    resultados = []
+    for turno in ORDEM_TURNOS:
+        legenda_turno = df_legenda[df_legenda["turno"] == turno].drop(columns="turno").reset_index(drop=True)
+        if legenda_turno.empty:
+            continue
+        area_total_mapa_ha = pd.to_numeric(legenda_turno["Área trabalhada (ha)"], errors="coerce").fillna(0).sum()
+        if area_total_mapa_ha < parametros["AREA_MIN_OPERADOR_HA"]:
+            continue
+        periodo_ini, periodo_fim = obter_periodo(None, df_faz[df_faz["turno"] == turno])
+        resultados.append({
+            "tipo": "operador",
+            "fazenda_id": fazenda_id,
+            "nome_fazenda": nome_fazenda,
+            "frente": nome_frente,
+            "turno": turno,
+            "png": None,
+            "pdf": None,
+            "df_legenda": legenda_turno,
+            "area_ha": float(area_total_mapa_ha),
+            "desenho": {
+                "base_fazenda": base_fazenda,
+                "gdf_area_colhedora": gdf_area_colhedora[gdf_area_colhedora["turno"] == turno].drop(columns="turno").reset_index(drop=True),
+                "cores": criar_cores_distintas(legenda_turno["Colhedora"].astype(str).tolist()),
+                "periodo_txt": f"{periodo_ini} até {periodo_fim}" if periodo_ini != "-" else intervalo_turno(turno),
+            },
+        })
+    return resultados
+
+
+def preparar_fazenda_vel_rpm(fazenda_id, dados_fazenda, df_faz, coluna_linha, parametros):
+    """Faixas classificadas de velocidade e RPM de uma fazenda, a partir de linhas (coluna_linha) ou de pontos."""
+    base_fazenda, geom_fazenda, nome_fazenda = dados_fazenda["base"], dados_fazenda["geom"], dados_fazenda["nome"]
+    periodo_ini, periodo_fim = obter_periodo(None, df_faz)
+    if coluna_linha is not None:
+        gdf_linhas = criar_linhas_por_wkt(df_faz, coluna_linha, geom_fazenda)
+    else:
+        gdf_linhas = criar_linhas_por_pontos(df_faz, geom_fazenda)
+    if gdf_linhas.empty:
+        return None
+    with medir_etapa("buffer_uniao", linhas=len(gdf_linhas)) as medida:
+        gdf_plot = criar_poligonos_display(gdf_linhas, geom_fazenda)
+        medida["geometrias"] = len(gdf_plot)
+    if gdf_plot.empty:
+        return None
+
+    with medir_etapa("classificacao", geometrias=len(gdf_plot)):
+        mapas = classificar_vel_rpm(gdf_plot, df_faz, parametros)
+    return {
+        "tipo": "vel_rpm",
+        "fazenda_id": fazenda_id,
+        "nome_fazenda": nome_fazenda,
+        "png_vel": None,
+        "pdf_vel": None,
+        "png_rpm": None,
+        "pdf_rpm": None,
+        "df_leg_vel": mapas["vel"]["legenda"],
+        "df_leg_rpm": mapas["rpm"]["legenda"],
+        "vel_media": mapas["vel"]["media"],
+        "rpm_medio": mapas["rpm"]["media"],
+        "desenho": {
+            "base_fazenda": base_fazenda,
+            "gdf_plot": gdf_plot,
+            "mapas": mapas,
+            "periodo": (periodo_ini, periodo_fim),
+        },
+    }
+
+
+def figuras_mapa_area(fazenda_id, resultado):
+    """Páginas do PDF de área (mapa e tabela de talhões), montadas uma por vez."""
+    desenho, nome_fazenda = resultado["desenho"], resultado["nome_fazenda"]
+    with medir_etapa("figura"):
+        fig = criar_figura_area(
+            desenho["base_fazenda"], desenho["area_trabalhada"], resultado["area_total_ha"], resultado["area_trab_ha"],
+            desenho["area_nao_ha"], resultado["pct_trab"], desenho["pct_nao"], *desenho["periodo"], fazenda_id, nome_fazenda,
+        )
+    yield fig
+    yield from criar_figuras_tabela_talhoes_pdf(resultado["df_talhoes"], fazenda_id, nome_fazenda)
+
+
+def renderizar_fazenda(fazenda_id, resultado, previa=True):
+    """Monta as figuras de um resultado preparado e devolve só os campos renderizados (png/pdf)."""
+    desenho, nome_fazenda = resultado["desenho"], resultado["nome_fazenda"]
+    if resultado["tipo"] == "area":
+        png, pdf = renderizar_mapa(figuras_mapa_area(fazenda_id, resultado), previa)
+        return {"png": png, "pdf": pdf}
+    if resultado["tipo"] == "operador":
+        with medir_etapa("figura"):
+            fig_op = criar_figura_area_colhedora(
+                desenho["base_fazenda"], desenho["gdf_area_colhedora"], resultado["df_legenda"], desenho["cores"],
+                resultado["turno"], desenho["periodo_txt"], fazenda_id, nome_fazenda, frente_nome=resultado["frente"],
+            )
+        png, pdf = renderizar_mapa([fig_op], previa)
+        return {"png": png, "pdf": pdf}
+    renderizados = {}
+    for chave, titulo, titulo_legenda in [("vel", "Mapa de Velocidade", "Legenda de Velocidade"), ("rpm", "Mapa de RPM", "Legenda de RPM")]:
+        mapa = desenho["mapas"][chave]
+        with medir_etapa("figura"):
+            fig = criar_figura_tematica(
+                desenho["base_fazenda"], desenho["gdf_plot"], f"classe_{chave}", mapa["cores"], mapa["legenda"],
+                titulo, titulo_legenda, mapa["faixa_txt"], mapa["media_txt"],
+                *desenho["periodo"], fazenda_id, nome_fazenda,
+            )
+        renderizados[f"png_{chave}"], renderizados[f"pdf_{chave}"] = renderizar_mapa([fig], previa)
+    return renderizados
+
+
+def finalizar_resultado(resultado, previa=True):
+    """Renderiza o resultado preparado e descarta o que só servia para desenhar."""
+    if resultado is None:
+        return None
+    resultado = {**resultado, **renderizar_fazenda(resultado["fazenda_id"], resultado, previa)}
+    resultado.pop("desenho")
+    return resultado
+
+
+def processar_fazenda_area(fazenda_id, dados_fazenda, df_faz_area, coluna_poligono, parametros, previa=True):
+    """Mapa de área trabalhada de uma fazenda, já renderizado; com previa=False sem o PNG da tela (uso em lote)."""
+    return finalizar_resultado(preparar_fazenda_area(fazenda_id, dados_fazenda, df_faz_area, coluna_poligono, parametros), previa)
+
+
+def processar_fazenda_operador(fazenda_id, dados_fazenda, df_faz, coluna_linha, nome_frente, parametros, previa=True):
+    """Mapas de área por colhedora de uma fazenda, um por turno, já renderizados."""
+    return [finalizar_resultado(r, previa) for r in preparar_fazenda_operador(fazenda_id, dados_fazenda, df_faz, coluna_linha, nome_frente, parametros)]
+
+
+def processar_fazenda_vel_rpm(fazenda_id, dados_fazenda, df_faz, coluna_linha, parametros, previa=True):
+    """Mapas de velocidade e RPM de uma fazenda, já renderizados."""
+    return finalizar_resultado(preparar_fazenda_vel_rpm(fazenda_id, dados_fazenda, df_faz, coluna_linha, parametros), previa)
+
+
+def completar_renderizacao(resultados, num_processos=None):
+    """Renderiza, em paralelo, os resultados preparados que ainda não têm mapa, atualizando cada um no lugar.
+
+    Os resultados são os da sessão (lista exibida e cache dela); um mesmo resultado que
+    apareça mais de uma vez na lista, como dois acertos de cache iguais, é desenhado uma vez.
+    """
+    pendentes = list({id(r): r for r in resultados if r is not None and "desenho" in r}.values())
+    tarefas = [(r["fazenda_id"], r) for r in pendentes]
+    for resultado, renderizados in zip(pendentes, executar_em_paralelo(renderizar_fazenda, tarefas, num_processos)):
+        resultado.update(renderizados)
+        resultado.pop("desenho", None)
+
+
+def montar_pdf_frente(nome_frente, registros):
+    """PDF da frente: separador de cada turno seguido dos mapas já renderizados daquele turno.
+
+    Só junta os bytes de cada mapa: nenhuma figura das fazendas é redesenhada, e cada
+    separador é fechado assim que vira PDF.
+    """
+    pdfs = []
+    for turno in ORDEM_TURNOS:
+        registros_turno = [r for r in registros if r["turno"] == turno]
+        if not registros_turno:
+            continue
+        pdfs.append(renderizar_mapa([criar_figura_separador_turno_pdf(nome_frente, turno)], previa=False)[1])
+        pdfs.extend(r["pdf"] for r in registros_turno)
+    with medir_etapa("pdf", paginas=len(pdfs)):
+        return juntar_pdfs(pdfs)
+
+# =========================================================
+# PACOTE COM TODOS OS ARQUIVOS
+# =========================================================
+# Um ZIP com todos os PDFs/CSVs de uma execução e um manifesto.json com os números de
+# cada fazenda. Os arquivos entram no ZIP conforme as fazendas ficam prontas, um de
+# cada vez; PDFs vão sem recompressão (já são comprimidos), CSVs com deflate.
+def nome_pdf_frente(nome_frente):
+    return f"mapas_area_colhedora_operador_{slug_texto(nome_frente)}.pdf"
+
+
+def arquivos_resultado(resultado):
+    """(nome, conteúdo) de cada arquivo de um resultado renderizado, com os nomes dos downloads do app."""
+    fazenda_id = resultado["fazenda_id"]
+    if resultado["tipo"] == "area":
+        yield f"mapa_area_{fazenda_id}.pdf", resultado["pdf"]
+        if resultado["df_talhoes"] is not None:
+            yield f"area_por_talhao_{fazenda_id}.csv", csv_talhoes_bytes(preparar_tabela_talhoes_exportacao(resultado["df_talhoes"]))
+    elif resultado["tipo"] == "operador":
+        chave_individual = slug_texto(f"{resultado['frente']}_{resultado['turno']}_{fazenda_id}")
+        yield f"mapa_area_colhedora_operador_{chave_individual}.pdf", resultado["pdf"]
+    else:
+        yield f"mapa_velocidade_{fazenda_id}.pdf", resultado["pdf_vel"]
+        yield f"mapa_rpm_{fazenda_id}.pdf", resultado["pdf_rpm"]
+
+
+def numero_json(valor, casas=2):
+    return None if pd.isna(valor) else round(float(valor), casas)
+
+
+def novo_manifesto(modo, parametros):
+    return {"modo": modo, "gerado_em": datetime.now().isoformat(timespec="seconds"), "parametros": parametros, "fazendas": []}
+
+
+def resumo_manifesto(resultado, arquivos):
+    """Linha do manifesto de uma fazenda: áreas ou médias do mapa e os arquivos gerados."""
+    linha = {"fazenda_id": resultado["fazenda_id"], "nome_fazenda": resultado["nome_fazenda"]}
+    if resultado["tipo"] == "area":
+        linha.update({
+            "area_total_ha": numero_json(resultado["area_total_ha"]),
+            "area_trabalhada_ha": numero_json(resultado["area_trab_ha"]),
+            "pct_trabalhado": numero_json(resultado["pct_trab"], 1),
+        })
+    elif resultado["tipo"] == "operador":
+        linha.update({
+            "frente": resultado["frente"],
+            "turno": resultado["turno"],
+            "area_trabalhada_ha": numero_json(resultado["area_ha"]),
+            "colhedoras": len(resultado["df_legenda"]),
+        })
+    else:
+        linha.update({"vel_media_kmh": numero_json(resultado["vel_media"], 1), "rpm_medio": numero_json(resultado["rpm_medio"], 0)})
+    linha["arquivos"] = arquivos
+    return linha
+
+
+def manifesto_json(manifesto):
+    return json.dumps(manifesto, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def iniciar_pacote(destino, modo, parametros):
+    """Abre o ZIP em `destino` (caminho ou arquivo binário) para receber as fazendas."""
+    return {"destino": destino, "zip": zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED), "manifesto": novo_manifesto(modo, parametros)}
+
+
+def adicionar_arquivo_pacote(pacote, nome, conteudo):
+    compressao = zipfile.ZIP_STORED if nome.endswith(".pdf") else zipfile.ZIP_DEFLATED
+    pacote["zip"].writestr(nome, conteudo, compress_type=compressao)
+
+
+def adicionar_ao_pacote(pacote, resultado):
+    nomes = []
+    for nome, conteudo in arquivos_resultado(resultado):
+        adicionar_arquivo_pacote(pacote, nome, conteudo)
+        nomes.append(nome)
+    pacote["manifesto"]["fazendas"].append(resumo_manifesto(resultado, nomes))
+
+
+def fechar_pacote(pacote):
+    """Grava o manifesto.json e fecha o ZIP; devolve o manifesto."""
+    with medir_etapa("pacote", arquivos=len(pacote["zip"].infolist()) + 1):
+        pacote["zip"].writestr("manifesto.json", manifesto_json(pacote["manifesto"]))
+        pacote["zip"].close()
+    return pacote["manifesto"]
+
+# =========================================================
+# ARMAZÉM INCREMENTAL
+# =========================================================
+# Exportações diárias se sobrepõem (janela móvel de 7 dias, por exemplo). No modo
+# incremental cada linha recebida vai para um Parquet particionado por fazenda e dia,
+# sem repetir o que já está guardado (chave: equipamento + horário inicial), e os mapas
+# saem do histórico completo das fazendas enviadas. No modo área a união das passadas
+# de cada fazenda também fica guardada (WKB, CRS métrico): só o WKT das linhas novas é
+# lido e unido a ela. O fechamento de falhas, os buracos e o recorte dependem dos
+# parâmetros e continuam sendo refeitos a cada execução sobre essa área bruta.
+# A área bruta é gravada antes das partições: se a execução parar no meio, as linhas
+# voltam como novas na próxima e unir de novo as mesmas passadas não muda a área.
+# Linhas sem horário inicial não entram na deduplicação (são sempre gravadas).
+#
+#   armazem/<conjunto>/registros/cd_fazenda=<código>/data=<AAAA-MM-DD>/parte-<id>.parquet
+#   armazem/<conjunto>/areas_brutas.parquet
+def conjunto_armazem(modo, pontos=False):
+    """Pasta do armazém de um modo; os pontos de Velocidade/RPM ficam separados das linhas."""
+    return CHAVE_MODO[modo] + ("_pontos" if pontos else "")
+
+
+def pasta_particao(pasta_conjunto, fazenda_id, data):
+    """Pasta de uma fazenda e dia. Um código que o slug altera ganha um sufixo do hash do
+    código original, para que "A/1" e "A_1" não caiam na mesma partição."""
+    nome = slug_texto(fazenda_id)
+    if nome != str(fazenda_id):
+        nome = f"{nome}-{hashlib.sha1(str(fazenda_id).encode('utf-8')).hexdigest()[:8]}"
+    return os.path.join(pasta_conjunto, "registros", f"cd_fazenda={nome}", f"data={data}")
+
+
+def chaves_registros(df):
+    """Chave de cada linha (equipamento + horário inicial em ns) para a deduplicação e
+    máscara das linhas que têm horário; as outras não têm chave confiável."""
+    equipamento = df["cd_equipamento"].astype(object).where(df["cd_equipamento"].notna(), "").astype(str) if "cd_equipamento" in df.columns else pd.Series("", index=df.index)
+    horario = pd.to_datetime(df["dt_hr_local_inicial"], errors="coerce").astype("datetime64[ns]")
+    com_horario = horario.notna().to_numpy()
+    chaves = pd.MultiIndex.from_arrays([equipamento.to_numpy(), horario.astype("int64").to_numpy()])
+    return chaves, com_horario
+
+
+def separar_linhas_novas(pasta, conjunto, df):
+    """Linhas de `df` que o armazém ainda não tem, como [(pasta da partição, linhas)], sem gravar nada.
+
+    Linhas sem horário inicial passam sempre: sem ele, todas teriam a mesma chave.
+    """
+    if "dt_hr_local_inicial" not in df.columns:
+        raise ValueError("O modo incremental precisa da coluna dt_hr_local_inicial.")
+    pasta_conjunto = os.path.join(pasta, conjunto)
+    colunas_chave = [c for c in CHAVE_REGISTRO if c in df.columns]
+    df = df[df["cd_fazenda"].notna()]
+    chaves, com_horario = chaves_registros(df)
+    df = df.loc[~(chaves.duplicated() & com_horario)]
+    datas = pd.to_datetime(df["dt_hr_local_inicial"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("sem_data")
+    particoes = []
+    for (fazenda_id, data), df_particao in df.groupby([df["cd_fazenda"].astype(str), datas], sort=False):
+        destino = pasta_particao(pasta_conjunto, fazenda_id, data)
+        existentes = glob.glob(os.path.join(destino, "*.parquet"))
+        if existentes:
+            guardadas = pd.concat([pd.read_parquet(c, columns=colunas_chave) for c in existentes], ignore_index=True)
+            chaves, com_horario = chaves_registros(df_particao)
+            df_particao = df_particao.loc[~(chaves.isin(chaves_registros(guardadas)[0]) & com_horario)]
+        if not df_particao.empty:
+            particoes.append((destino, df_particao))
+    return particoes
+
+
+def gravar_particoes(particoes):
+    for destino, df_particao in particoes:
+        # Categorical vira texto: cada parte teria um dicionário diferente.
+        gravar_parquet(
+            df_particao.astype({c: object for c in df_particao.columns if isinstance(df_particao[c].dtype, pd.CategoricalDtype)}),
+            os.path.join(destino, f"parte-{uuid.uuid4().hex}.parquet"),
+        )
+
+
+def juntar_particoes(particoes, df):
+    return pd.concat([p for _, p in particoes], ignore_index=True) if particoes else df.iloc[:0]
+
+
+def incorporar_ao_armazem(pasta, conjunto, df):
+    """Grava no armazém as linhas de `df` que ele ainda não tem e devolve só essas linhas novas."""
+    with medir_etapa("armazem", linhas=len(df)) as medida:
+        particoes = separar_linhas_novas(pasta, conjunto, df)
+        gravar_particoes(particoes)
+        df_novos = juntar_particoes(particoes, df)
+        medida["novas"] = len(df_novos)
+    return df_novos
+
+
+def ler_armazem(pasta, conjunto, fazendas, excluir=()):
+    """Todas as linhas guardadas das `fazendas`, no formato da leitura dos ZIPs (compactar_colunas)."""
+    pasta_conjunto = os.path.join(pasta, conjunto)
+    with medir_etapa("armazem") as medida:
+        partes = []
+        for fazenda_id in fazendas:
+            for caminho in sorted(glob.glob(os.path.join(pasta_particao(pasta_conjunto, fazenda_id, "*"), "*.parquet"))):
+                df_parte = ler_parquet(caminho)
+                partes.append(df_parte.drop(columns=[c for c in excluir if c in df_parte.columns]))
+        df = compactar_colunas(pd.concat(partes, ignore_index=True)) if partes else None
+        medida["linhas"] = 0 if df is None else len(df)
+    return df
+
+
+def ler_areas_brutas(pasta, conjunto):
+    caminho = os.path.join(pasta, conjunto, "areas_brutas.parquet")
+    if not os.path.exists(caminho):
+        return {}
+    df = pd.read_parquet(caminho)
+    return dict(zip(df["cd_fazenda"].astype(str), df["area_bruta"]))
+
+
+def unir_area_bruta(fazenda_id, area_anterior, df_novos, coluna_poligono):
+    """Área bruta guardada de uma fazenda somada às passadas novas, em WKB."""
+    anterior = shapely.from_wkb(area_anterior) if area_anterior is not None else None
+    area_bruta = uniao_passadas(df_novos, coluna_poligono, anterior)
+    return fazenda_id, None if area_bruta is None else shapely.to_wkb(area_bruta)
+
+
+def atualizar_areas_brutas(pasta, conjunto, df_novos, coluna_poligono, fazendas, num_processos=None):
+    """Une as passadas novas à área bruta de cada fazenda (em paralelo) e devolve {fazenda: WKB}."""
+    areas = ler_areas_brutas(pasta, conjunto)
+    novos_por_fazenda = dict(iter(df_novos.groupby(df_novos["cd_fazenda"].astype(str), sort=False)))
+    tarefas = [(f, areas.get(f), novos_por_fazenda[f], coluna_poligono) for f in fazendas if f in novos_por_fazenda]
+    if tarefas:
+        for fazenda_id, area_bruta in executar_em_paralelo(unir_area_bruta, tarefas, num_processos):
+            areas[fazenda_id] = area_bruta
+        gravar_parquet(
+            pd.DataFrame({"cd_fazenda": list(areas), "area_bruta": list(areas.values())}),
+            os.path.join(pasta, conjunto, "areas_brutas.parquet"),
+        )
+    return {f: areas.get(f) for f in fazendas}
+
+
+def processar_incremental(pasta, conjunto, df, coluna_poligono=None, num_processos=None):
+    """Incorpora `df` (já filtrado para o modo) ao armazém e devolve (histórico, áreas brutas).
+
+    O histórico traz todas as linhas guardadas das fazendas presentes em `df`. Com
+    `coluna_poligono` (modo área) as áreas brutas dessas fazendas são atualizadas e o
+    histórico vem sem o WKT, que não precisa mais ser lido; sem ela, áreas brutas é None.
+    """
+    fazendas = sorted(df["cd_fazenda"].dropna().astype(str).unique(), key=chave_ordenacao_mista)
+    if coluna_poligono is None:
+        df_novos, areas_brutas = incorporar_ao_armazem(pasta, conjunto, df), None
+    else:
+        with medir_etapa("armazem", linhas=len(df)) as medida:
+            particoes = separar_linhas_novas(pasta, conjunto, df)
+            df_novos = juntar_particoes(particoes, df)
+            medida["novas"] = len(df_novos)
+        areas_brutas = atualizar_areas_brutas(pasta, conjunto, df_novos, coluna_poligono, fazendas, num_processos)
+        gravar_particoes(particoes)
+    excluir = [coluna_poligono] if coluna_poligono is not None else []
+    return ler_armazem(pasta, conjunto, fazendas, excluir), areas_brutas
+
+
+def com_areas_brutas(fazendas_base, areas_brutas):
+    """Cópia de fazendas_base com a área bruta guardada de cada fazenda (sem alterar a base em cache)."""
+    if not areas_brutas:
+        return fazendas_base
+    return {
+        fazenda_id: {**dados, "area_bruta": areas_brutas[fazenda_id]} if areas_brutas.get(fazenda_id) is not None else dados
+        for fazenda_id, dados in fazendas_base.items()
+    }
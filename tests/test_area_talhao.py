@@ -0,0 +1,50 @@
+"""Área trabalhada por talhão (STRtree) contra o gpd.overlay de antes."""
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry import Polygon
+
+from processamento import CRS_METRICO, area_trabalhada_por_talhao
+
+
+def area_com_falhas(semente=0):
+    """Bloco trabalhado com falhas redondas, mais uma mancha isolada."""
+    rng = np.random.default_rng(semente)
+    furos = shapely.union_all(shapely.buffer(shapely.points(rng.uniform(0, 650, (30, 2))), rng.uniform(5, 40, 30)))
+    return shapely.box(0, 0, 650, 1000).difference(furos).union(shapely.Point(900, 500).buffer(120))
+
+
+def test_area_por_talhao_igual_ao_overlay():
+    area = area_com_falhas()
+    xs = np.arange(-100, 1200, 100.0)
+    x0, y0 = [a.ravel() for a in np.meshgrid(xs, xs)]
+    talhoes = shapely.box(x0, y0, x0 + 100, y0 + 100)
+    base = gpd.GeoDataFrame({"id": np.arange(len(talhoes))}, geometry=talhoes, crs=CRS_METRICO)
+    intersec = gpd.overlay(base, gpd.GeoDataFrame(geometry=[area], crs=CRS_METRICO), how="intersection")
+    esperado = intersec.assign(area=intersec.area).groupby("id")["area"].sum().reindex(base["id"], fill_value=0.0).to_numpy()
+    obtido = area_trabalhada_por_talhao(talhoes, area)
+    np.testing.assert_allclose(obtido, esperado, rtol=1e-9, atol=1e-6)
+    assert (obtido == 0).any() and np.isclose(obtido, 10000).any()
+
+
+def test_area_por_talhao_sem_area():
+    talhoes = shapely.box([0, 10], [0, 0], [10, 20], [10, 10])
+    assert area_trabalhada_por_talhao(talhoes, None).tolist() == [0.0, 0.0]
+    assert area_trabalhada_por_talhao(talhoes, Polygon()).tolist() == [0.0, 0.0]
+
+
+def test_area_por_talhao_so_borda_calcula_intersecao(monkeypatch):
+    circulo = shapely.Point(0, 0).buffer(100)
+    # Dentro do círculo, cortado pela borda e no canto do envelope (sem tocar o círculo).
+    talhoes = shapely.box([-10, 90, 80], [-10, -10, 80], [10, 110, 100], [10, 10, 100])
+    pares = []
+    intersection = shapely.intersection
+
+    def contar_pares(a, b, **kwargs):
+        pares.append(len(a))
+        return intersection(a, b, **kwargs)
+
+    monkeypatch.setattr(shapely, "intersection", contar_pares)
+    obtido = area_trabalhada_por_talhao(talhoes, circulo)
+    assert pares == [1]
+    assert obtido[0] == 400 and 0 < obtido[1] < 400 and obtido[2] == 0
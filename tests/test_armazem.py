@@ -0,0 +1,53 @@
+"""Armazém incremental: deduplicação, nomes das partições e ordem de gravação."""
+import os
+
+import pandas as pd
+import pytest
+
+import processamento
+from processamento import incorporar_ao_armazem, pasta_particao, processar_incremental
+
+
+def linhas(fazendas, horarios, equipamento="5001"):
+    return pd.DataFrame({
+        "cd_fazenda": fazendas,
+        "cd_equipamento": equipamento,
+        "dt_hr_local_inicial": pd.to_datetime(horarios),
+        "vl_velocidade": 5.0,
+        "poligono": "POLYGON ((-45 -21, -44.999 -21, -44.999 -20.999, -45 -20.999, -45 -21))",
+    })
+
+
+def test_repetidas_ficam_fora_mas_sem_horario_sempre_entram(tmp_path):
+    df = linhas(["101"] * 4, ["2025-10-29 08:00", "2025-10-29 08:00", None, None])
+    assert len(incorporar_ao_armazem(str(tmp_path), "area", df)) == 3
+    novas = incorporar_ao_armazem(str(tmp_path), "area", df)
+    assert len(novas) == 2 and novas["dt_hr_local_inicial"].isna().all()
+
+
+def test_codigos_com_o_mesmo_slug_nao_dividem_particao(tmp_path):
+    assert pasta_particao("x", "101", "d") == os.path.join("x", "registros", "cd_fazenda=101", "data=d")
+    assert pasta_particao("x", "A/1", "d") != pasta_particao("x", "A_1", "d")
+    assert len(incorporar_ao_armazem(str(tmp_path), "area", linhas(["A/1"], ["2025-10-29 08:00"]))) == 1
+    assert len(incorporar_ao_armazem(str(tmp_path), "area", linhas(["A_1"], ["2025-10-29 08:00"]))) == 1
+
+
+def test_area_bruta_gravada_antes_das_particoes(tmp_path, monkeypatch):
+    gravar = processamento.gravar_parquet
+    gravados = []
+
+    def gravar_e_anotar(df, caminho):
+        gravados.append(os.path.basename(caminho))
+        if caminho.endswith(".parquet") and os.path.basename(caminho).startswith("parte-"):
+            raise OSError("disco cheio")
+        gravar(df, caminho)
+
+    monkeypatch.setattr(processamento, "gravar_parquet", gravar_e_anotar)
+    df = linhas(["101"], ["2025-10-29 08:00"])
+    with pytest.raises(OSError):
+        processar_incremental(str(tmp_path), "area", df, "poligono", num_processos=1)
+    assert gravados[0] == "areas_brutas.parquet"
+
+    monkeypatch.setattr(processamento, "gravar_parquet", gravar)
+    historico, areas = processar_incremental(str(tmp_path), "area", df, "poligono", num_processos=1)
+    assert len(historico) == 1 and areas["101"] is not None
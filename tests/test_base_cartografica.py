@@ -0,0 +1,27 @@
+"""Cache em disco da base cartográfica."""
+import geopandas as gpd
+import shapely
+
+import processamento
+from processamento import carregar_base_cartografica
+
+
+def test_cache_interrompido_nao_deixa_pickle_pela_metade(tmp_path, monkeypatch):
+    caminho = tmp_path / "base.gpkg"
+    gpd.GeoDataFrame({"FAZENDA": ["101"], "TALHAO": ["1"]}, geometry=[shapely.box(-45, -21, -44.99, -20.99)], crs="EPSG:4326").to_file(caminho)
+    pasta_cache = tmp_path / "cache"
+    monkeypatch.setattr(processamento, "PASTA_CACHE", str(pasta_cache))
+    dump = processamento.pickle.dump
+
+    def dump_interrompido(obj, f, protocol=None):
+        f.write(b"\x80\x05meio")
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(processamento.pickle, "dump", dump_interrompido)
+    assert "101" in carregar_base_cartografica(str(caminho))["fazendas"]
+    assert list(pasta_cache.iterdir()) == []
+
+    processamento._BASES_CARREGADAS.clear()
+    monkeypatch.setattr(processamento.pickle, "dump", dump)
+    carregar_base_cartografica(str(caminho))
+    assert [p.suffix for p in pasta_cache.iterdir()] == [".pkl"]
@@ -0,0 +1,51 @@
+"""Preenchimento de buracos em lote contra o laço por anel interno."""
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+
+from processamento import preencher_buracos_pequenos
+
+
+def preencher_buracos_por_anel(geom, area_max_buraco_m2=5000):
+    """Versão original: um Polygon por anel interno e nova união das partes."""
+    if geom is None or geom.is_empty:
+        return geom
+    if geom.geom_type == "Polygon":
+        interiores_mantidos = [i for i in geom.interiors if Polygon(i).area > area_max_buraco_m2]
+        return Polygon(geom.exterior, interiores_mantidos).buffer(0)
+    if geom.geom_type == "MultiPolygon":
+        partes = [preencher_buracos_por_anel(g, area_max_buraco_m2) for g in geom.geoms if not g.is_empty]
+        partes = [g for g in partes if g is not None and not g.is_empty]
+        return unary_union(partes).buffer(0) if partes else geom
+    return geom
+
+
+def poligono_com_buracos_e_ilhas(semente=1):
+    rng = np.random.default_rng(semente)
+    centros = rng.uniform(50, 1950, (400, 2))
+    raios = rng.uniform(1, 60, 400)
+    furos = shapely.union_all(shapely.buffer(shapely.points(centros), raios))
+    geom = shapely.box(0, 0, 2000, 2000).difference(furos)
+    ilhas = shapely.union_all(shapely.buffer(shapely.points(centros[:40]), raios[:40] * 0.3))
+    return shapely.union_all([geom, ilhas])
+
+
+@pytest.mark.parametrize("area_max", [0, 500, 5000, 1e9])
+def test_preencher_buracos_igual_ao_laco_por_anel(area_max):
+    geom = poligono_com_buracos_e_ilhas()
+    esperado = preencher_buracos_por_anel(geom, area_max)
+    obtido = preencher_buracos_pequenos(geom, area_max)
+    assert obtido.is_valid
+    assert obtido.symmetric_difference(esperado).area < 1e-6
+    assert shapely.get_num_interior_rings(shapely.get_parts(obtido)).sum() == shapely.get_num_interior_rings(shapely.get_parts(esperado)).sum()
+
+
+def test_preencher_buracos_casos_triviais():
+    quadrado = shapely.box(0, 0, 10, 10)
+    assert preencher_buracos_pequenos(quadrado, 5000) is quadrado
+    assert preencher_buracos_pequenos(None) is None
+    assert preencher_buracos_pequenos(Polygon()).is_empty
+    linha = shapely.LineString([(0, 0), (1, 1)])
+    assert preencher_buracos_pequenos(linha) is linha
@@ -0,0 +1,89 @@
+"""Faixas de velocidade/RPM: a classificação em lote contra a versão linha a linha."""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from processamento import gerar_faixas, classificar_faixas, calcular_legenda_percentual
+
+
+def classificar_valor(valor, faixas):
+    """Versão original, aplicada linha a linha."""
+    if pd.isna(valor):
+        return None
+    for a, b, label in faixas:
+        if np.isneginf(a) and valor < b:
+            return label
+        if np.isinf(b) and valor >= a:
+            return label
+        if not np.isinf(b) and not np.isneginf(a) and a <= valor < b:
+            return label
+    return None
+
+
+def legenda_percentual_linha_a_linha(gdf_linhas, coluna_classe, faixas, mapa_cores):
+    dados = gdf_linhas.dropna(subset=[coluna_classe]).copy()
+    total_tempo = dados["duracao_seg"].fillna(0).sum() if "duracao_seg" in dados.columns else 0
+    usar_contagem = total_tempo <= 0
+    linhas = []
+    for _, _, label in faixas:
+        sub = dados[dados[coluna_classe] == label]
+        if usar_contagem:
+            pct = len(sub) / len(dados) * 100 if len(dados) else 0
+        else:
+            pct = sub["duracao_seg"].fillna(0).sum() / total_tempo * 100 if total_tempo else 0
+        linhas.append({"cor": mapa_cores.get(label, "#cccccc"), "faixa": label, "percentual": pct})
+    return pd.DataFrame(linhas)
+
+
+# O app e o CLI exigem máximo acima do mínimo.
+COMBINACOES = [
+    (vmin, vmax, passo)
+    for vmin, vmax, passo in itertools.product([0.0, 1.0, 3.7, 4.0], [1.5, 3.0, 7.5, 8.0, 12.3], [0.1, 0.25, 0.3, 0.7, 1.0, 1.5])
+    if vmax > vmin
+]
+
+
+@pytest.mark.parametrize("vmin,vmax,passo", COMBINACOES)
+def test_faixas_crescentes_e_fim_fixo(vmin, vmax, passo):
+    faixas = gerar_faixas(vmin, vmax, passo, casas=1)
+    limites = [a for a, _, _ in faixas[1:]]
+    assert all(a < b for a, b in zip(limites, limites[1:]))
+    for (_, b, _), (a, _, _) in zip(faixas, faixas[1:]):
+        assert a == b
+    assert faixas[-1][0] >= vmax - 1e-9
+
+
+@pytest.mark.parametrize("vmin,vmax,passo", COMBINACOES)
+def test_classificar_faixas_igual_a_linha_a_linha(vmin, vmax, passo):
+    faixas = gerar_faixas(vmin, vmax, passo, casas=1)
+    rng = np.random.default_rng(0)
+    limites = np.array([a for a, _, _ in faixas[1:]])
+    valores = np.concatenate([rng.uniform(vmin - 2, vmax + 2, 500), limites, [np.nan]])
+    esperado = [classificar_valor(v, faixas) for v in valores]
+    obtido = classificar_faixas(valores, faixas)
+    assert [None if pd.isna(c) else c for c in obtido] == esperado
+
+
+def test_classificar_faixas_rpm():
+    faixas = gerar_faixas(1200, 2000, 100)
+    valores = [np.nan, 0, 1199.9, 1200, 1250, 1999.9, 2000, 5000]
+    obtido = list(classificar_faixas(valores, faixas))
+    assert obtido[1:] == ["< 1200", "< 1200", "1200 a 1300", "1200 a 1300", "1900 a 2000", "2000+", "2000+"]
+    assert pd.isna(obtido[0])
+
+
+@pytest.mark.parametrize("com_duracao", [True, False])
+def test_legenda_percentual_igual_a_linha_a_linha(com_duracao):
+    faixas = gerar_faixas(4.0, 8.0, 0.5, casas=1)
+    cores = {label: f"#00000{i % 10}" for i, (_, _, label) in enumerate(faixas)}
+    rng = np.random.default_rng(1)
+    gdf = pd.DataFrame({"vel": rng.uniform(2, 10, 300)})
+    gdf.loc[::17, "vel"] = np.nan
+    gdf["duracao_seg"] = rng.uniform(0, 60, 300) if com_duracao else np.nan
+    gdf.loc[::5, "duracao_seg"] = np.nan
+    gdf["classe"] = classificar_faixas(gdf["vel"], faixas)
+    esperado = legenda_percentual_linha_a_linha(gdf.assign(classe=gdf["classe"].astype(object)), "classe", faixas, cores)
+    obtido = calcular_legenda_percentual(gdf, "classe", faixas, cores)
+    pd.testing.assert_frame_equal(obtido.reset_index(drop=True), esperado, check_dtype=False)
@@ -0,0 +1,45 @@
+"""Fechamento da área em blocos contra a união inteira com os três buffers."""
+import numpy as np
+import pytest
+import shapely
+
+from processamento import fechar_area_trabalhada
+
+
+def passadas_sinteticas(n_linhas=40, comprimento=1000.0, trecho=100.0, semente=0):
+    """Passadas de 3 m em linhas paralelas a cada 10 m, com trechos faltando e um leve zigue-zague."""
+    rng = np.random.default_rng(semente)
+    linhas = []
+    for j in range(n_linhas):
+        y = j * 10.0 + rng.normal(0, 0.5)
+        for x in np.arange(0, comprimento, trecho)[rng.random(int(comprimento / trecho)) > 0.1]:
+            xs = np.linspace(x, x + trecho + rng.uniform(-3, 3), 8)
+            linhas.append(shapely.LineString(np.c_[xs, y + np.cumsum(rng.normal(0, 0.3, 8))]))
+    return shapely.buffer(np.array(linhas), 1.5, cap_style="flat")
+
+
+def diferenca_relativa(a, b):
+    return a.symmetric_difference(b).area / b.area
+
+
+@pytest.mark.parametrize("semente", [0, 1])
+@pytest.mark.parametrize("dist,recuo", [(8.0, 2.4), (20.0, 6.0), (3.0, 0.0), (0.0, 0.0)])
+def test_fechar_area_em_blocos_igual_a_geometria_inteira(dist, recuo, semente):
+    passadas = passadas_sinteticas(semente=semente)
+    inteira = shapely.union_all(passadas)
+    if dist > 0:
+        inteira = inteira.buffer(dist, join_style=2).buffer(-recuo, join_style=2)
+    inteira = inteira.buffer(0)
+    em_blocos = fechar_area_trabalhada(passadas, dist, recuo, bloco_m=250.0)
+    um_bloco = fechar_area_trabalhada(passadas, dist, recuo, bloco_m=1e6)
+    assert em_blocos.is_valid
+    assert abs(em_blocos.area - inteira.area) / inteira.area < 2e-5
+    assert diferenca_relativa(em_blocos, inteira) < 1e-4
+    assert diferenca_relativa(em_blocos, um_bloco) < 1e-6
+
+
+def test_fechar_area_simplificada_dentro_da_tolerancia():
+    passadas = passadas_sinteticas()
+    exata = fechar_area_trabalhada(passadas, 8.0, 2.4, bloco_m=250.0)
+    simplificada = fechar_area_trabalhada(passadas, 8.0, 2.4, tolerancia_m=0.5, bloco_m=250.0)
+    assert abs(simplificada.area - exata.area) / exata.area < 1e-3
@@ -0,0 +1,53 @@
+"""Leitura dos CSVs da Solinftec: encoding detectado na amostra e corrigido no resto do arquivo, colunas de geometria achadas na amostra."""
+import io
+import zipfile
+
+from processamento import MODO_OPERADOR, colunas_do_modo, detectar_coluna_geometria, ler_csv_robusto, ler_dados_zip
+
+CABECALHO = "cd_fazenda;cd_operador;desc_operador;vl_velocidade\n"
+
+
+def csv_latin1_com_acento_tardio(linhas_ascii=4000):
+    """Exportação em latin1 cujos primeiros 64 KB são ASCII e o acento só aparece depois."""
+    corpo = "".join(f"101;{i};OPERADOR {i};5.5\n" for i in range(linhas_ascii))
+    dados = (CABECALHO + corpo + "101;9999;JOÃO CONCEIÇÃO;6.0\n").encode("latin1")
+    assert len(CABECALHO + corpo) > 65536
+    return dados
+
+
+def test_latin1_depois_da_amostra(tmp_path):
+    caminho = tmp_path / "linhas.csv"
+    caminho.write_bytes(csv_latin1_com_acento_tardio())
+    df = ler_csv_robusto(str(caminho))
+    assert len(df) == 4001
+    assert df["desc_operador"].iloc[-1] == "JOÃO CONCEIÇÃO"
+    assert df["vl_velocidade"].dtype == "float32"
+
+
+def test_latin1_depois_da_amostra_dentro_do_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("linhas.csv", csv_latin1_com_acento_tardio())
+    dados = ler_dados_zip(buffer)
+    assert dados["erros"] == []
+    assert len(dados["df"]) == 4001
+    assert "JOÃO CONCEIÇÃO" in set(dados["df"]["desc_operador"])
+
+
+def test_utf8_continua_utf8(tmp_path):
+    caminho = tmp_path / "linhas.csv"
+    caminho.write_bytes((CABECALHO + "101;1;JOSÉ;5.5\n").encode("utf-8"))
+    assert ler_csv_robusto(str(caminho))["desc_operador"].tolist() == ["JOSÉ"]
+
+
+def test_geometria_com_nome_fora_da_lista_continua_lida(tmp_path):
+    caminho = tmp_path / "linhas.csv"
+    caminho.write_text(
+        "cd_fazenda;trajeto;obs\n"
+        '101;"LINESTRING (-45 -21, -44.99 -21)";a\n'
+        "101;;b\n",
+        encoding="utf-8",
+    )
+    df = ler_csv_robusto(str(caminho), colunas=colunas_do_modo(MODO_OPERADOR))
+    assert list(df.columns) == ["cd_fazenda", "trajeto"]
+    assert detectar_coluna_geometria(df, ["LINESTRING"]) == "trajeto"
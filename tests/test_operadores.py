@@ -0,0 +1,65 @@
+"""Modo colhedora: rótulos de operador e áreas por colhedora/turno em lote."""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from processamento import CRS_METRICO, ORDEM_TURNOS, agrupar_area_por_colhedora, normalizar_codigo, rotulos_operadores, uniao_por_grupo
+
+
+def rotulo_linha_a_linha(op):
+    """Montagem de agrupar_area_por_colhedora antes do lote, com o nome ausente tratado como vazio."""
+    cd = normalizar_codigo(op["cd_operador"])
+    desc = "" if pd.isna(op["desc_operador"]) else str(op["desc_operador"]).strip()
+    if cd and desc:
+        return f"{cd} - {desc}"
+    return cd or desc
+
+
+def test_rotulos_iguais_a_linha_a_linha():
+    df = pd.DataFrame({
+        "cd_operador": pd.Categorical(["12", None, None, "7", "5.0", "8"]),
+        "desc_operador": pd.Categorical(["Ana", None, "Bia", None, " Caio ", ""]),
+    })
+    esperado = [rotulo_linha_a_linha(op) for _, op in df.astype(object).iterrows()]
+    assert rotulos_operadores(df).tolist() == esperado == ["12 - Ana", "", "Bia", "7", "5 - Caio", "8"]
+
+
+def test_rotulos_sem_colunas_de_operador():
+    df = pd.DataFrame({"cd_operador": [1.0, np.nan]})
+    assert rotulos_operadores(df).tolist() == ["", ""]
+
+
+def linhas_colhedoras(semente=0, n=300):
+    rng = np.random.default_rng(semente)
+    x0, y0 = rng.uniform(0, 900, n), rng.uniform(0, 900, n)
+    geoms = shapely.linestrings(np.stack([np.c_[x0, y0], np.c_[x0 + rng.uniform(20, 120, n), y0 + rng.normal(0, 5, n)]], axis=1))
+    return gpd.GeoDataFrame({
+        "cd_equipamento": pd.Categorical(rng.choice(["101", "102", "203", None], n, p=[0.4, 0.3, 0.25, 0.05])),
+        "cd_operador": pd.Categorical(rng.choice(["11", "12", None], n)),
+        "desc_operador": pd.Categorical(rng.choice(["ANA", "BIA", None], n)),
+        "vl_largura_implemento": rng.choice([3.0, 6.0, np.nan], n),
+        "turno": rng.choice(ORDEM_TURNOS, n),
+    }, geometry=geoms, crs=CRS_METRICO)
+
+
+def test_uniao_por_grupo_igual_ao_laco():
+    geoms = shapely.buffer(shapely.points(np.arange(20.0), np.zeros(20)), 0.7)
+    grupos = np.array([2, 0, 2, 5, 0] * 4)
+    presentes, uniao = uniao_por_grupo(geoms, grupos)
+    assert presentes.tolist() == [0, 2, 5]
+    for grupo, geom in zip(presentes, uniao):
+        assert geom.equals(shapely.union_all(geoms[grupos == grupo]))
+
+
+def test_area_por_colhedora_com_turnos_igual_a_um_turno_por_vez():
+    gdf = linhas_colhedoras()
+    geom_fazenda = shapely.box(50, 50, 900, 900)
+    areas, legenda = agrupar_area_por_colhedora(gdf, geom_fazenda)
+    for turno in ORDEM_TURNOS:
+        areas_turno, legenda_turno = agrupar_area_por_colhedora(gdf[gdf["turno"] == turno].drop(columns="turno"), geom_fazenda)
+        obtida = legenda[legenda["turno"] == turno].drop(columns="turno").reset_index(drop=True)
+        pd.testing.assert_frame_equal(obtida, legenda_turno)
+        geoms = areas[areas["turno"] == turno].set_index("cd_equipamento").geometry
+        for colhedora, geom in zip(areas_turno["cd_equipamento"], areas_turno.geometry):
+            assert geoms[colhedora].symmetric_difference(geom).area < 1e-6
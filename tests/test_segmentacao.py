@@ -0,0 +1,21 @@
+"""Segmentação de pontos em lote contra o laço por equipamento guardado no benchmark."""
+import pandas as pd
+import shapely
+
+from benchmarks.bench_segmentacao import criar_linhas_por_pontos_legado, gerar_dia_pontos, geometria_fazenda
+from processamento import criar_linhas_por_pontos
+
+
+def test_segmentar_pontos_igual_ao_laco_antigo():
+    geom_fazenda = geometria_fazenda()
+    df = gerar_dia_pontos(4000, n_equipamentos=5, semente=3)
+    colunas = ["rpm_medio", "vel_media", "duracao_seg", "largura_media"]
+
+    def ordenados(gdf):
+        tabela = pd.DataFrame(gdf[colunas]).assign(comprimento=gdf.length.round(6), wkt=shapely.to_wkt(gdf.geometry.values, rounding_precision=4))
+        return tabela.sort_values(["wkt"]).reset_index(drop=True)
+
+    legado = criar_linhas_por_pontos_legado(df, geom_fazenda)
+    novo = criar_linhas_por_pontos(df, geom_fazenda)
+    assert len(novo) == len(legado) > 0
+    pd.testing.assert_frame_equal(ordenados(novo), ordenados(legado), check_dtype=False)